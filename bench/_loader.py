@@ -0,0 +1,23 @@
+"""Import the add-on's pure-Python modules without running its Anki entry point.
+
+``myaddon/__init__.py`` needs a live Anki main window, so the benchmarks
+register the folder as a bare package and import submodules from it.
+"""
+
+from __future__ import annotations
+
+import importlib
+from pathlib import Path
+import sys
+import types
+
+ADDON_DIR = Path(__file__).resolve().parent.parent / "myaddon"
+PACKAGE = "myaddon"
+
+
+def load(name: str) -> types.ModuleType:
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(ADDON_DIR)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,50 @@
+"""Synthetic WAV fixtures shared by the benchmarks."""
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+import random
+import struct
+import wave
+
+
+def write_tone(
+    path: Path,
+    seconds: float,
+    rate: int = 48000,
+    channels: int = 1,
+    sampwidth: int = 2,
+    amplitude: float = 0.3,
+    block_frames: int = 48000,
+) -> Path:
+    """Write a noisy 220 Hz tone in blocks so large fixtures stay cheap."""
+    rng = random.Random(1234)
+    full_scale = (1 << (8 * sampwidth - 1)) - 1
+    total = int(seconds * rate)
+    step = 2 * math.pi * 220 / rate
+    with wave.open(str(path), "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(sampwidth)
+        writer.setframerate(rate)
+        done = 0
+        while done < total:
+            count = min(block_frames, total - done)
+            values = []
+            for i in range(done, done + count):
+                sample = amplitude * math.sin(step * i) + rng.uniform(-0.01, 0.01)
+                values.extend([int(sample * full_scale)] * channels)
+            writer.writeframesraw(_pack(values, sampwidth))
+            done += count
+    return path
+
+
+def _pack(values: list[int], sampwidth: int) -> bytes:
+    if sampwidth == 1:
+        # 8-bit WAV is unsigned.
+        return bytes(v + 128 for v in values)
+    if sampwidth == 2:
+        return struct.pack(f"<{len(values)}h", *values)
+    if sampwidth == 3:
+        return b"".join(v.to_bytes(4, "little", signed=True)[:3] for v in values)
+    return struct.pack(f"<{len(values)}i", *values)
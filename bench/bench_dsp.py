@@ -0,0 +1,59 @@
+"""Compare the DSP backends on 8/16/24/32-bit WAV data.
+
+``mul`` must match exactly; ``rms`` and ``mean`` may differ by up to one LSB,
+since ``audioop`` truncates them to integers.
+
+Usage: python bench/bench_dsp.py [seconds]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+import wave
+
+from _loader import load
+from _wavgen import write_tone
+
+dsp = load("dsp")
+
+
+def _time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        for width in dsp.SUPPORTED_WIDTHS:
+            path = write_tone(Path(tmp) / f"w{width}.wav", seconds, sampwidth=width)
+            with wave.open(str(path), "rb") as reader:
+                data = reader.readframes(reader.getnframes())
+            size_mb = len(data) / 1e6
+            reference = None
+            for name in dsp.available_backends():
+                backend = dsp.get_backend(name)
+                result = (backend.mul(data, width, 1.5), backend.rms(data, width), backend.mean(data, width))
+                if reference is None:
+                    reference = result
+                same = result[0] == reference[0] and all(
+                    abs(a - b) <= 1.0 for a, b in zip(result[1:], reference[1:])
+                )
+                match = "ok" if same else "MISMATCH"
+                mul = _time(lambda: backend.mul(data, width, 1.5))
+                peak = _time(lambda: backend.peak(data, width))
+                rms = _time(lambda: backend.rms(data, width))
+                print(
+                    f"{8 * width:2d}-bit  {name:8s} mul {size_mb / mul:8.1f} MB/s  "
+                    f"peak {size_mb / peak:8.1f} MB/s  rms {size_mb / rms:8.1f} MB/s  {match}"
+                )
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
@@ -0,0 +1,69 @@
+"""Compression ratio and encode/decode speed of the built-in FLAC encoder.
+
+Each fixture is encoded with NumPy and with the pure-Python fallback, then
+decoded again and compared with the WAV samples. Decoding is set against
+reading the same samples from the WAV file with ``wave``.
+
+Usage: python bench/bench_flac.py [seconds]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+from _loader import load
+from _wavgen import write_tone
+
+flac = load("flac")
+
+FIXTURES = (
+    ("48 kHz mono 16-bit", 48000, 1, 2),
+    ("48 kHz stereo 16-bit", 48000, 2, 2),
+    ("16 kHz mono 16-bit", 16000, 1, 2),
+    ("48 kHz mono 24-bit", 48000, 1, 3),
+)
+
+
+def _read_wav(path: Path) -> bytes:
+    with wave.open(str(path), "rb") as reader:
+        return reader.readframes(reader.getnframes())
+
+
+def run(seconds: float) -> None:
+    numpy = flac.np
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, rate, channels, width in FIXTURES:
+            source = write_tone(Path(tmp) / "source.wav", seconds, rate=rate, channels=channels, sampwidth=width)
+            wav_size = source.stat().st_size
+            started = time.perf_counter()
+            samples = _read_wav(source)
+            wav_read = time.perf_counter() - started
+            print(f"{label}: {seconds:.0f} s, WAV {wav_size / 1e6:.2f} MB, read {wav_read * 1000:.0f} ms")
+            for backend, module_np in (("numpy", numpy), ("python", None)):
+                if backend == "numpy" and numpy is None:
+                    continue
+                flac.np = module_np
+                take = Path(tmp) / "take.wav"
+                shutil.copyfile(source, take)
+                started = time.perf_counter()
+                encoded = flac.encode_wav(take)
+                encode = time.perf_counter() - started
+                started = time.perf_counter()
+                _, decoded = flac.decode(encoded)
+                decode = time.perf_counter() - started
+                ratio = encoded.stat().st_size / wav_size
+                print(
+                    f"  {backend:6s}  ratio {ratio:5.3f}  encode {encode:6.2f} s ({seconds / encode:5.0f}x realtime)"
+                    f"  decode {decode:6.2f} s  {'ok' if decoded == samples else 'MISMATCH'}"
+                )
+                encoded.unlink()
+    flac.np = numpy
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 60.0)
@@ -0,0 +1,40 @@
+"""Throughput and peak memory of the streaming gain pass.
+
+Usage: python bench/bench_gain.py [minutes ...]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _loader import load
+from _wavgen import write_tone
+
+wavproc = load("wavproc")
+
+
+def run(minutes: float, in_place: bool) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_tone(Path(tmp) / "take.wav", minutes * 60)
+        size_mb = path.stat().st_size / 1e6
+        tracemalloc.start()
+        started = time.perf_counter()
+        wavproc.amplify_wav(path, 1.5, in_place=in_place)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mode = "mmap" if in_place else "copy"
+        print(
+            f"{mode}  {minutes:5.1f} min  {size_mb:7.1f} MB  {elapsed:6.2f} s  "
+            f"{size_mb / elapsed:7.1f} MB/s  peak {peak / 1024:7.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:] or ["1", "5"]:
+        for in_place in (False, True):
+            run(float(arg), in_place)
@@ -0,0 +1,52 @@
+"""Throughput of the post-take gain pass: plain gain vs limiter vs compressor + limiter.
+
+Usage: python bench/bench_limiter.py [seconds] [gain]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from _loader import load
+from _wavgen import write_tone
+
+dsp = load("dsp")
+stages = load("stages")
+wavproc = load("wavproc")
+
+
+def run(seconds: float, gain: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_tone(Path(tmp) / "take.wav", seconds, channels=2)
+        layout = wavproc.read_layout(path)
+        width, channels, rate = layout.sampwidth, layout.channels, layout.rate
+        size_mb = path.stat().st_size / 1e6
+        for name in dsp.available_backends():
+            backend = dsp.get_backend(name)
+            variants = {
+                "gain": lambda: stages.Gain(width, channels, rate, gain, backend=backend),
+                "limiter": lambda: stages.Limiter(width, channels, rate, gain, backend=backend),
+                "comp+limiter": lambda: stages.Chain(
+                    [
+                        stages.Compressor(width, channels, rate, backend=backend),
+                        stages.Limiter(width, channels, rate, gain, backend=backend),
+                    ]
+                ),
+            }
+            for label, make in variants.items():
+                # Fresh file each time: every pass rewrites it in place.
+                write_tone(path, seconds, channels=2)
+                started = time.perf_counter()
+                wavproc.process_wav(path, make())
+                elapsed = time.perf_counter() - started
+                print(f"{name:8s} {label:13s} {seconds:6.0f} s audio  {elapsed:6.2f} s  {size_mb / elapsed:7.1f} MB/s")
+
+
+if __name__ == "__main__":
+    run(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 60.0,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 2.0,
+    )
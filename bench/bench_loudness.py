@@ -0,0 +1,39 @@
+"""Throughput of the streaming loudness/true-peak analysis pass.
+
+Usage: python bench/bench_loudness.py [seconds]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from _loader import load
+from _wavgen import write_tone
+
+loudness = load("loudness")
+
+
+def run(seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_tone(Path(tmp) / "take.wav", seconds, channels=2)
+        size_mb = path.stat().st_size / 1e6
+        numpy = loudness.np
+        for label, module_np in (("numpy", numpy), ("python", None)):
+            if label == "numpy" and numpy is None:
+                continue
+            loudness.np = module_np
+            started = time.perf_counter()
+            stats = loudness.analyze_wav(path)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{label:6s}  {seconds:6.0f} s audio  {elapsed:6.2f} s  {size_mb / elapsed:7.1f} MB/s  "
+                f"{stats.integrated_lufs:6.1f} LUFS  {stats.true_peak_dbtp:5.1f} dBTP"
+            )
+        loudness.np = numpy
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 60.0)
@@ -0,0 +1,71 @@
+"""Header-only probing of a folder of takes against opening each with ``wave``.
+
+A short fixture is copied N times (every tenth copy as FLAC). The folder is
+then measured with ``wave.open`` + ``readframes``, with a cold ``Prober``,
+with the same ``Prober`` again (all cache hits) and with a fresh ``Prober``
+loading the saved cache.
+
+Usage: python bench/bench_probe.py [files]
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+from _loader import load
+from _wavgen import write_tone
+
+flac = load("flac")
+probe = load("probe")
+
+
+def _read_all(paths: list[Path]) -> float:
+    total = 0.0
+    for path in paths:
+        if path.suffix != ".wav":
+            continue
+        with wave.open(str(path), "rb") as reader:
+            reader.readframes(reader.getnframes())
+            total += reader.getnframes() / reader.getframerate()
+    return total
+
+
+def run(count: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        folder = root / "media"
+        folder.mkdir()
+        source = write_tone(root / "source.wav", 3.0, rate=48000)
+        shutil.copyfile(source, root / "copy.wav")
+        encoded = flac.encode_wav(root / "copy.wav")
+        for i in range(count):
+            template = encoded if i % 10 == 0 else source
+            shutil.copyfile(template, folder / f"voice_{i:06d}{template.suffix}")
+        paths = sorted(folder.iterdir())
+        print(f"{count} files, {sum(p.stat().st_size for p in paths) / 1e6:.0f} MB")
+
+        started = time.perf_counter()
+        _read_all(paths)
+        print(f"  wave.open + read (WAV only)  {time.perf_counter() - started:7.2f} s")
+
+        cache = root / "probe_cache.tsv"
+        prober = probe.Prober(cache)
+        for label in ("probe, cold", "probe, cached"):
+            started = time.perf_counter()
+            found = prober.scan(folder)
+            print(f"  {label:28s} {time.perf_counter() - started:7.2f} s  ({len(found)} probed)")
+        prober.save()
+        started = time.perf_counter()
+        found = probe.Prober(cache).scan(folder)
+        print(f"  {'probe, cache from file':28s} {time.perf_counter() - started:7.2f} s  ({len(found)} probed)")
+        minutes = sum(info.duration for info in found.values()) / 60
+        print(f"  total {minutes:.1f} min")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,126 @@
+"""Startup cost the add-on adds to Anki, eager vs lazy multimedia setup.
+
+Each sample runs in a fresh interpreter so import caches don't hide the cost.
+Both cases import the real ``myaddon`` package, with ``aqt`` and ``anki``
+replaced by small stand-ins (``aqt.qt`` is PyQt6 itself, ``mw`` a bare main
+window with a temporary profile folder). "lazy" is what Anki does now at
+startup: import the add-on, which only registers menu actions. "eager" also
+builds the ``VoiceRecorder``, as the add-on used to at import time, which
+imports QtMultimedia, creates the capture session, recorder and player,
+opens the profile's recording index and enumerates input devices.
+Requires PyQt6 with QtMultimedia.
+
+Usage: python bench/bench_startup.py [runs]
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+
+ADDON_PARENT = Path(__file__).resolve().parent.parent
+
+_PRELUDE = f"""
+import sys, tempfile, time, types
+from PyQt6.QtWidgets import QApplication, QMainWindow, QMenu
+
+app = QApplication([])
+
+qt = types.ModuleType("aqt.qt")
+for name in ("QtCore", "QtGui", "QtWidgets"):
+    module = __import__("PyQt6." + name, fromlist=["*"])
+    qt.__dict__.update({{k: v for k, v in vars(module).items() if not k.startswith("_")}})
+
+class AddonManager:
+    def addonFromModule(self, module):
+        return module.split(".")[0]
+    def getConfig(self, addon):
+        return None
+    def writeConfig(self, addon, config):
+        pass
+    def setConfigUpdatedAction(self, module, action):
+        pass
+
+class Media:
+    def dir(self):
+        return tempfile.gettempdir()
+
+profile = tempfile.TemporaryDirectory()
+
+class ProfileManager:
+    def profileFolder(self):
+        return profile.name
+
+mw = QMainWindow()
+mw.form = types.SimpleNamespace(menuTools=QMenu("Tools", mw))
+mw.addonManager = AddonManager()
+mw.col = types.SimpleNamespace(media=Media())
+mw.pm = ProfileManager()
+mw.state = "deckBrowser"
+
+aqt = types.ModuleType("aqt")
+aqt.mw = mw
+aqt.qt = qt
+aqt.gui_hooks = types.SimpleNamespace(profile_did_open=[], profile_will_close=[])
+aqt.utils = types.ModuleType("aqt.utils")
+aqt.utils.askUser = aqt.utils.showWarning = aqt.utils.tooltip = lambda *args, **kwargs: None
+aqt.operations = types.ModuleType("aqt.operations")
+aqt.operations.CollectionOp = None
+anki = types.ModuleType("anki")
+anki.utils = types.ModuleType("anki.utils")
+anki.utils.strip_html = lambda text: text
+sys.modules.update({{
+    "aqt": aqt, "aqt.qt": qt, "aqt.utils": aqt.utils, "aqt.operations": aqt.operations,
+    "anki": anki, "anki.utils": anki.utils,
+}})
+sys.path.insert(0, {str(ADDON_PARENT)!r})
+
+started = time.perf_counter()
+import myaddon
+"""
+
+_EAGER = """
+myaddon._get_recorder()
+"""
+
+_REPORT = """
+print((time.perf_counter() - started) * 1000)
+print("QtMultimedia imported:", "PyQt6.QtMultimedia" in sys.modules, file=sys.stderr)
+"""
+
+
+def _sample(body: str) -> tuple[float, str]:
+    script = _PRELUDE + body + _REPORT
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env={"QT_QPA_PLATFORM": "offscreen", **os.environ},
+    )
+    lines = result.stderr.strip().splitlines() or ["no output"]
+    if result.returncode != 0:
+        raise RuntimeError(lines[-1])
+    return float(result.stdout.strip().splitlines()[-1]), lines[-1]
+
+
+def run(runs: int) -> None:
+    for label, body in (("lazy", ""), ("eager", _EAGER)):
+        samples = []
+        try:
+            for _ in range(runs):
+                elapsed, note = _sample(body)
+                samples.append(elapsed)
+        except RuntimeError as exc:
+            print(f"{label:5s}  failed: {exc}")
+            continue
+        print(
+            f"{label:5s}  median {statistics.median(samples):8.1f} ms  "
+            f"min {min(samples):8.1f} ms  max {max(samples):8.1f} ms  ({note})"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
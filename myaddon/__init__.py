@@ -2,202 +2,114 @@
 
 from __future__ import annotations
 
-from datetime import datetime
-from pathlib import Path
-import wave
-import audioop
-
-from aqt import mw
-from aqt.qt import QAction, QFileDialog, QInputDialog, QKeySequence, QMenu, Qt, QUrl
-from aqt.utils import showInfo, showWarning, tooltip
-from PyQt6.QtMultimedia import (
-    QAudioInput,
-    QAudioOutput,
-    QMediaCaptureSession,
-    QMediaDevices,
-    QMediaFormat,
-    QMediaPlayer,
-    QMediaRecorder,
+from typing import TYPE_CHECKING
+
+from aqt import gui_hooks, mw
+from aqt.qt import QAction, QFileDialog, QInputDialog, QKeySequence, QMenu
+from aqt.utils import showWarning, tooltip
+
+from .config import (
+    DEFAULT_PLAY_SHORTCUT,
+    DEFAULT_RECORD_SHORTCUT,
+    get_config,
+    get_save_dir,
+    invalidate,
+    is_valid_shortcut,
+    settings,
+    write_config,
 )
 
+if TYPE_CHECKING:
+    from .recorder import VoiceRecorder
 
-class VoiceRecorder:
-    def __init__(self) -> None:
-        # Wire up the capture session, recorder, and playback pipeline.
-        self._capture = QMediaCaptureSession()
-        device = QMediaDevices.defaultAudioInput()
-        if device.isNull():
-            devices = QMediaDevices.audioInputs()
-            names = [d.description() for d in devices]
-            print(f"AnkiVoiceRecorder audio inputs: {names}")
-            self._audio_input = None
-        else:
-            self._audio_input = QAudioInput(device)
-        self._recorder = QMediaRecorder()
-        if self._audio_input is not None:
-            self._capture.setAudioInput(self._audio_input)
-        self._capture.setRecorder(self._recorder)
-        # Playback uses a simple media player -> audio output chain.
-        self._audio_output = QAudioOutput()
-        self._player = QMediaPlayer()
-        self._player.setAudioOutput(self._audio_output)
-        self._recording = False
-        self._last_path: Path | None = None
-
-    def toggle(self) -> None:
-        if self._recording:
-            self.stop()
-        else:
-            self.start()
-
-    def start(self) -> None:
-        if mw.col is None:
-            showWarning("No collection is open.")
-            return
-        if self._audio_input is None:
-            showWarning("No audio input device available.")
-            return
-
-        # Build a timestamped output path in the configured media folder.
-        media_dir = _get_save_dir()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"voice_{timestamp}.wav"
-        path = media_dir / filename
-
-        # Configure WAV output and start recording to disk.
-        fmt = QMediaFormat()
-        fmt.setFileFormat(QMediaFormat.FileFormat.Wave)
-        self._recorder.setMediaFormat(fmt)
-        self._recorder.setOutputLocation(QUrl.fromLocalFile(str(path)))
-        self._recorder.record()
-
-        self._recording = True
-        self._last_path = path
-        record_shortcut = _get_record_shortcut()
-        tooltip(f"Recording started ({record_shortcut} to stop)", parent=mw, period=2000)
-
-    def stop(self) -> None:
-        self._recorder.stop()
-        self._recording = False
-
-        if self._last_path is not None:
-            # Post-process for a simple gain boost after recording.
-            _amplify_wav(self._last_path, _get_gain())
-            print(f"AnkiVoiceRecorder saved: {self._last_path}")
-            tooltip(f"Recording saved: {self._last_path.name}", parent=mw, period=2000)
-        else:
-            tooltip("Recording stopped.", parent=mw, period=2000)
-
-    def play_last(self) -> None:
-        if self._last_path is None:
-            showWarning("No recording available yet.")
-            return
-        if not self._last_path.exists():
-            showWarning("Last recording file is missing.")
-            return
-        self._player.setSource(QUrl.fromLocalFile(str(self._last_path)))
-        self._player.play()
-        tooltip("Playing last recording", parent=mw, period=2000)
-
-
-_recorder = VoiceRecorder()
-
-# Defaults used when user config is missing or invalid.
-DEFAULT_RECORD_SHORTCUT = "Ctrl+R"
-DEFAULT_PLAY_SHORTCUT = "Ctrl+Shift+R"
-
-
-# Returns add-on's ID by asking Anki's add-on manager to look up the module name
-def _addon_id() -> str:
-    return mw.addonManager.addonFromModule(__name__)
-
-
-def _get_config() -> dict:
-    config = mw.addonManager.getConfig(_addon_id())
-    if config is None:
-        # First-run defaults are stored back into Anki's config store.
-        config = {
-            "save_dir": "",
-            "gain": 1,
-            "record_shortcut": DEFAULT_RECORD_SHORTCUT,
-            "play_shortcut": DEFAULT_PLAY_SHORTCUT,
-        }
-        _write_config(config)
-    return config
-
-
-# That helper writes your add‑on’s config in a way that works across Anki versions.
-def _write_config(config: dict) -> None:
-    if hasattr(mw.addonManager, "writeConfig"):
-        mw.addonManager.writeConfig(_addon_id(), config)
-    else:
-        mw.addonManager.setConfig(_addon_id(), config)
-
-
-def _get_save_dir() -> Path:
-    config = _get_config()
-    raw_path = str(config.get("save_dir", "")).strip()
-    if raw_path:
-        return Path(raw_path)
-    # Fall back to the collection media directory.
-    return Path(mw.col.media.dir())
-
-
-def _get_gain() -> float:
-    # Keep gain within a safe range to avoid clipping.
-    config = _get_config()
-    try:
-        gain = float(config.get("gain", 1.25))
-    except (TypeError, ValueError):
-        gain = 1.25
-    if gain < 0.1:
-        return 0.1
-    if gain > 5.0:
-        return 5.0
-    return gain
-
-
-def _is_valid_shortcut(text: str) -> bool:
-    return not QKeySequence(text).isEmpty()
-
-
-def _get_record_shortcut() -> str:
-    config = _get_config()
-    raw = str(config.get("record_shortcut", DEFAULT_RECORD_SHORTCUT)).strip()
-    if raw and _is_valid_shortcut(raw):
-        return QKeySequence(raw).toString()
-    return DEFAULT_RECORD_SHORTCUT
-
-
-def _get_play_shortcut() -> str:
-    config = _get_config()
-    raw = str(config.get("play_shortcut", DEFAULT_PLAY_SHORTCUT)).strip()
-    if raw and _is_valid_shortcut(raw):
-        return QKeySequence(raw).toString()
-    return DEFAULT_PLAY_SHORTCUT
+# Created on first use: building it imports QtMultimedia and opens devices,
+# which would otherwise slow down every Anki launch.
+_recorder: VoiceRecorder | None = None
+
+
+def _get_recorder() -> VoiceRecorder:
+    global _recorder
+    if _recorder is None:
+        from .recorder import VoiceRecorder
+
+        _recorder = VoiceRecorder()
+        _recorder.apply_capture_settings()
+    return _recorder
+
+
+def _toggle_recording() -> None:
+    _get_recorder().toggle()
+
+
+def _play_last() -> None:
+    _get_recorder().play_last()
+
+
+def _play_recent(age: int) -> None:
+    _get_recorder().play_recent(age)
+
+
+def _step_history(delta: int) -> None:
+    _get_recorder().step_history(delta)
+
+
+def _index_existing() -> None:
+    _get_recorder().index_existing()
+
+
+def _merge_duplicates() -> None:
+    _get_recorder().merge_duplicates()
+
+
+def _on_profile_did_open() -> None:
+    if _recorder is not None:
+        # Same recorder, another profile: its index and history.
+        _recorder.load_profile()
+    # Warm and pre-roll modes need the device open before the first take.
+    current = settings()
+    if current.warm_pipeline or (current.capture_engine == "pcm" and current.preroll_seconds > 0):
+        _get_recorder()
+
+
+def _on_config_updated(_config: dict) -> None:
+    # Called after edits in Anki's add-on config dialog.
+    invalidate()
+    _apply_shortcuts()
+    if _recorder is not None:
+        _recorder.apply_capture_settings()
+
+
+def _on_profile_will_close() -> None:
+    # Let queued post-processing finish before the collection goes away.
+    if _recorder is not None:
+        _recorder.wait_for_post_processing()
 
 
 def _set_save_dir() -> None:
     # Let the user pick a persistent recording directory.
-    current = str(_get_save_dir())
+    current = str(get_save_dir())
     chosen = QFileDialog.getExistingDirectory(mw, "Select Recording Folder", current)
     if not chosen:
         return
-    config = _get_config()
+    config = get_config()
     config["save_dir"] = chosen
-    _write_config(config)
+    write_config(config)
     tooltip(f"Recording folder set to: {chosen}", parent=mw, period=2500)
 
 
 def _apply_shortcuts() -> None:
     # Update shortcuts without recreating the actions.
-    action_recording.setShortcut(QKeySequence(_get_record_shortcut()))
-    action_playback.setShortcut(QKeySequence(_get_play_shortcut()))
+    action_recording.setShortcut(QKeySequence(settings().record_shortcut))
+    action_playback.setShortcut(QKeySequence(settings().play_shortcut))
+    action_play_second.setShortcut(QKeySequence(settings().play_second_shortcut))
+    action_play_third.setShortcut(QKeySequence(settings().play_third_shortcut))
+    action_history_back.setShortcut(QKeySequence(settings().history_back_shortcut))
+    action_history_forward.setShortcut(QKeySequence(settings().history_forward_shortcut))
 
 
 def _set_keybindings() -> None:
     # Prompt for new shortcuts and persist them.
-    config = _get_config()
+    config = get_config()
     current_record = str(config.get("record_shortcut", DEFAULT_RECORD_SHORTCUT)).strip() or DEFAULT_RECORD_SHORTCUT
     record_text, ok = QInputDialog.getText(
         mw,
@@ -208,7 +120,7 @@ def _set_keybindings() -> None:
     if not ok:
         return
     record_text = record_text.strip()
-    if not _is_valid_shortcut(record_text):
+    if not is_valid_shortcut(record_text):
         showWarning("Invalid shortcut for recording.")
         return
 
@@ -222,41 +134,42 @@ def _set_keybindings() -> None:
     if not ok:
         return
     play_text = play_text.strip()
-    if not _is_valid_shortcut(play_text):
+    if not is_valid_shortcut(play_text):
         showWarning("Invalid shortcut for playback.")
         return
 
     config["record_shortcut"] = QKeySequence(record_text).toString()
     config["play_shortcut"] = QKeySequence(play_text).toString()
-    _write_config(config)
+    write_config(config)
     _apply_shortcuts()
     tooltip("Shortcuts updated.", parent=mw, period=2000)
 
 
-def _amplify_wav(path: Path, gain: float) -> None:
-    # Simple post-processing using stdlib WAV + audioop.
-    if not path.exists():
-        return
-    try:
-        with wave.open(str(path), "rb") as reader:
-            params = reader.getparams()
-            frames = reader.readframes(reader.getnframes())
-
-        amplified = audioop.mul(frames, params.sampwidth, gain)
-        with wave.open(str(path), "wb") as writer:
-            writer.setparams(params)
-            writer.writeframes(amplified)
-    except Exception as exc:
-        print(f"AnkiVoiceRecorder gain failed: {exc}")
-
 # Main UI actions that integrate into Anki's Tools menu.
 action_recording = QAction("AnkiVoiceRecorder: Toggle Recording", mw)
-action_recording.setShortcut(QKeySequence(_get_record_shortcut()))
-action_recording.triggered.connect(_recorder.toggle)
+action_recording.setShortcut(QKeySequence(settings().record_shortcut))
+action_recording.triggered.connect(_toggle_recording)
 
 action_playback = QAction("AnkiVoiceRecorder: Play Last Recording", mw)
-action_playback.setShortcut(QKeySequence(_get_play_shortcut()))
-action_playback.triggered.connect(_recorder.play_last)
+action_playback.setShortcut(QKeySequence(settings().play_shortcut))
+action_playback.triggered.connect(_play_last)
+
+# Recent takes: fixed second/third last, and stepping back and forth.
+action_play_second = QAction("AnkiVoiceRecorder: Play 2nd Last Recording", mw)
+action_play_second.setShortcut(QKeySequence(settings().play_second_shortcut))
+action_play_second.triggered.connect(lambda: _play_recent(1))
+
+action_play_third = QAction("AnkiVoiceRecorder: Play 3rd Last Recording", mw)
+action_play_third.setShortcut(QKeySequence(settings().play_third_shortcut))
+action_play_third.triggered.connect(lambda: _play_recent(2))
+
+action_history_back = QAction("AnkiVoiceRecorder: Play Older Recording", mw)
+action_history_back.setShortcut(QKeySequence(settings().history_back_shortcut))
+action_history_back.triggered.connect(lambda: _step_history(1))
+
+action_history_forward = QAction("AnkiVoiceRecorder: Play Newer Recording", mw)
+action_history_forward.setShortcut(QKeySequence(settings().history_forward_shortcut))
+action_history_forward.triggered.connect(lambda: _step_history(-1))
 
 settings_action = QAction("AnkiVoiceRecorder: Set Recording Folder...", mw)
 settings_action.triggered.connect(_set_save_dir)
@@ -264,16 +177,32 @@ settings_action.triggered.connect(_set_save_dir)
 keybindings_action = QAction("AnkiVoiceRecorder: Set Keybindings...", mw)
 keybindings_action.triggered.connect(_set_keybindings)
 
+index_action = QAction("AnkiVoiceRecorder: Index Existing Recordings", mw)
+index_action.triggered.connect(_index_existing)
+
+merge_action = QAction("AnkiVoiceRecorder: Merge Duplicate Recordings...", mw)
+merge_action.triggered.connect(_merge_duplicates)
+
 tools_menu = mw.form.menuTools
 anki_menu = QMenu("AnkiRecorder", mw)
 options_menu = QMenu("Options", mw)
 
 anki_menu.addAction(action_recording)
 anki_menu.addAction(action_playback)
+history_menu = QMenu("History", mw)
+for action in (action_play_second, action_play_third, action_history_back, action_history_forward):
+    history_menu.addAction(action)
+anki_menu.addMenu(history_menu)
 anki_menu.addSeparator()
 anki_menu.addMenu(options_menu)
 
 options_menu.addAction(settings_action)
 options_menu.addAction(keybindings_action)
+options_menu.addAction(index_action)
+options_menu.addAction(merge_action)
 
 tools_menu.addMenu(anki_menu)
+
+gui_hooks.profile_did_open.append(_on_profile_did_open)
+gui_hooks.profile_will_close.append(_on_profile_will_close)
+mw.addonManager.setConfigUpdatedAction(__name__, _on_config_updated)
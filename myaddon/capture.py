@@ -0,0 +1,243 @@
+"""Raw PCM capture on QAudioSource with per-chunk live processing.
+
+An alternative to the QMediaRecorder path: samples are pulled from the input
+device as they arrive, run through a stage chain and appended to a
+``StreamingWavWriter``, so the file is final the moment capture stops.
+
+A take can be stored in a different format than the device delivers: the
+device is asked for the requested rate, channel count and sample width, and
+conversion stages at the front of the chain make up for whatever it refuses.
+
+The engine can also be *armed*: the device stays open between takes, so a
+take starts without the backend spinning up again, and optionally the last
+few seconds of input are kept in a ring buffer which becomes the start of the
+next take. That covers the syllable spoken while the device spins up.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import time
+from typing import Callable
+
+from PyQt6.QtMultimedia import QAudio, QAudioDevice, QAudioFormat, QAudioSource
+
+from .ringbuffer import RingBuffer
+from .stages import Chain, Stage, conversion_stages
+from .wavproc import StreamingWavWriter
+
+# Sample formats the stage chain and WAV writer can store as-is.
+SAMPLE_WIDTHS = {
+    QAudioFormat.SampleFormat.UInt8: 1,
+    QAudioFormat.SampleFormat.Int16: 2,
+    QAudioFormat.SampleFormat.Int32: 4,
+}
+
+ChainFactory = Callable[[int, int, int], Stage]
+
+
+# Closest device sample format for each stored width (24-bit comes from Int32).
+_DEVICE_FORMATS = {
+    1: QAudioFormat.SampleFormat.UInt8,
+    2: QAudioFormat.SampleFormat.Int16,
+    3: QAudioFormat.SampleFormat.Int32,
+    4: QAudioFormat.SampleFormat.Int32,
+}
+
+
+def negotiate_format(device: QAudioDevice, width: int = 0, channels: int = 0, rate: int = 0) -> QAudioFormat:
+    """The supported format closest to the one requested (0 = device default).
+
+    Starts from the device's preferred format in an integer sample format,
+    then applies each requested property that the device accepts.
+    """
+    fmt = device.preferredFormat()
+    if fmt.sampleFormat() not in SAMPLE_WIDTHS:
+        for sample_format in (QAudioFormat.SampleFormat.Int16, QAudioFormat.SampleFormat.Int32):
+            fmt.setSampleFormat(sample_format)
+            if device.isFormatSupported(fmt):
+                break
+        else:
+            raise RuntimeError(f"{device.description()} offers no integer PCM format")
+    if width:
+        candidate = QAudioFormat(fmt)
+        candidate.setSampleFormat(_DEVICE_FORMATS[width])
+        if device.isFormatSupported(candidate):
+            fmt = candidate
+    if channels:
+        candidate = QAudioFormat(fmt)
+        candidate.setChannelCount(channels)
+        if device.isFormatSupported(candidate):
+            fmt = candidate
+    if rate:
+        candidate = QAudioFormat(fmt)
+        candidate.setSampleRate(rate)
+        if device.isFormatSupported(candidate):
+            fmt = candidate
+    return fmt
+
+
+class PcmCaptureEngine:
+    """Record one take at a time from ``device`` through a stage chain."""
+
+    def __init__(self, device: QAudioDevice) -> None:
+        self._device = device
+        self._source: QAudioSource | None = None
+        self._io = None
+        self._format: QAudioFormat | None = None
+        self._writer: StreamingWavWriter | None = None
+        self._chain: Stage | None = None
+        self._preroll: RingBuffer | None = None
+        self._keep_open = False
+        self._preroll_seconds = 0.0
+        # Requested (width, channels, rate) of the stored take; 0 = as captured.
+        self._wanted = (0, 0, 0)
+        # perf_counter() of the first sample written for the current take.
+        self.first_sample_at: float | None = None
+        # Pre-roll the current take started with, as captured, for a monitor
+        # attached after start(); the monitor itself only sees later buffers.
+        self.lead_in = b""
+        # Bytes of a frame split across two reads.
+        self._remainder = b""
+        self._frame_bytes = 0
+        # Called with every buffer read from the device, before any stage
+        # processing and whether or not a take is being written.
+        self.monitor: Callable[[bytes], None] | None = None
+
+    @property
+    def active(self) -> bool:
+        """True while a take is being written."""
+        return self._writer is not None
+
+    @property
+    def armed(self) -> bool:
+        return self._keep_open
+
+    @property
+    def frame_format(self) -> tuple[int, int, int] | None:
+        """``(sample width, channels, rate)`` while the device is open."""
+        if self._format is None:
+            return None
+        fmt = self._format
+        return SAMPLE_WIDTHS[fmt.sampleFormat()], fmt.channelCount(), fmt.sampleRate()
+
+    def request_format(self, width: int = 0, channels: int = 0, rate: int = 0) -> None:
+        """Store takes in this format (0 keeps the captured value).
+
+        Applies from the next take. An armed device is reopened right away
+        so it can be renegotiated.
+        """
+        wanted = (width, channels, rate)
+        if wanted == self._wanted:
+            return
+        self._wanted = wanted
+        if self._source is not None and not self.active:
+            self._close_source()
+            if self._keep_open:
+                self.arm(self._preroll_seconds)
+
+    def arm(self, preroll_seconds: float = 0.0) -> None:
+        """Keep the device open, buffering the last ``preroll_seconds`` of input."""
+        self._open_source()
+        self._keep_open = True
+        self._preroll_seconds = preroll_seconds
+        if preroll_seconds > 0:
+            rate = self._format.sampleRate()
+            capacity = int(preroll_seconds * rate) * self._frame_bytes
+            self._preroll = RingBuffer(capacity, align=self._frame_bytes)
+        else:
+            self._preroll = None
+
+    def disarm(self) -> None:
+        self._keep_open = False
+        self._preroll = None
+        if not self.active:
+            self._close_source()
+
+    def start(self, path: Path, make_chain: ChainFactory) -> None:
+        self._open_source()
+        captured = self.frame_format
+        stored = tuple(wanted or have for wanted, have in zip(self._wanted, captured))
+        # Conversions run first so the take's own stages see the stored format.
+        self._chain = Chain([*conversion_stages(*captured, *stored), make_chain(*stored)])
+        width, channels, rate = stored
+        self._writer = StreamingWavWriter(path, channels, rate, width)
+        self.first_sample_at = None
+        self.lead_in = b""
+        if self._preroll is not None:
+            # Pick up whatever arrived since the last read, then lead with it.
+            self._read_into_preroll()
+            if len(self._preroll):
+                self.first_sample_at = time.perf_counter()
+            self.lead_in = self._preroll.read()
+            self._writer.write(self._chain.process(self.lead_in))
+            self._preroll.clear()
+
+    def stop(self) -> Path:
+        """Finish the take and close the file; returns its path once it is final."""
+        if self._writer is None or self._chain is None:
+            raise RuntimeError("capture is not running")
+        self._drain()
+        self._writer.write(self._chain.flush())
+        self._writer.close()
+        path = self._writer.path
+        self._writer = None
+        self._chain = None
+        self.lead_in = b""
+        if not self._keep_open:
+            self._close_source()
+        return path
+
+    def _open_source(self) -> None:
+        if self._source is not None:
+            return
+        fmt = negotiate_format(self._device, *self._wanted)
+        source = QAudioSource(self._device, fmt)
+        io = source.start()
+        if source.error() != QAudio.Error.NoError or io is None:
+            raise RuntimeError(f"audio source failed to start: {source.error()}")
+        self._source = source
+        self._io = io
+        self._format = fmt
+        self._frame_bytes = SAMPLE_WIDTHS[fmt.sampleFormat()] * fmt.channelCount()
+        self._remainder = b""
+        io.readyRead.connect(self._drain)
+
+    def _close_source(self) -> None:
+        if self._source is None:
+            return
+        self._io.readyRead.disconnect(self._drain)
+        self._source.stop()
+        self._source = None
+        self._io = None
+        self._format = None
+        self._remainder = b""
+
+    def _read_frames(self) -> bytes:
+        data = self._remainder + self._io.readAll().data()
+        usable = len(data) - len(data) % self._frame_bytes
+        self._remainder = data[usable:]
+        return data[:usable]
+
+    def _read_into_preroll(self) -> None:
+        data = self._read_frames()
+        if data:
+            self._preroll.write(data)
+
+    def _drain(self) -> None:
+        if self._io is None:
+            return
+        if self._writer is None and self._preroll is None and self.monitor is None:
+            self._io.readAll()
+            return
+        data = self._read_frames()
+        if data and self.monitor is not None:
+            self.monitor(data)
+        if self._writer is None:
+            if data and self._preroll is not None:
+                self._preroll.write(data)
+            return
+        if data:
+            if self.first_sample_at is None:
+                self.first_sample_at = time.perf_counter()
+            self._writer.write(self._chain.process(data))
@@ -0,0 +1,298 @@
+"""Add-on configuration stored through Anki's add-on manager.
+
+The raw JSON dict is parsed and validated once into a frozen ``Settings``
+object. Anything on the record/stop path reads ``settings()``, which only
+goes back to the add-on manager after ``invalidate()`` (called when the
+config is written here or edited in Anki's config dialog).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from aqt import mw
+from aqt.qt import QKeySequence
+
+from .naming import DEFAULT_TEMPLATE, check_template
+
+# Defaults used when user config is missing or invalid.
+DEFAULT_RECORD_SHORTCUT = "Ctrl+R"
+DEFAULT_PLAY_SHORTCUT = "Ctrl+Shift+R"
+DEFAULT_PLAY_SECOND_SHORTCUT = "Ctrl+Shift+2"
+DEFAULT_PLAY_THIRD_SHORTCUT = "Ctrl+Shift+3"
+DEFAULT_HISTORY_BACK_SHORTCUT = "Ctrl+Shift+Left"
+DEFAULT_HISTORY_FORWARD_SHORTCUT = "Ctrl+Shift+Right"
+
+# Values accepted in the output_format preference list. "wav" and "flac" are
+# always available; the rest are encoded by Qt's backend if it can.
+OUTPUT_FORMATS = ("wav", "flac", "opus", "vorbis", "mp3", "aac")
+
+# First-run config; myaddon/config.json carries the same keys.
+DEFAULT_CONFIG = {
+    "save_dir": "",
+    "gain": 1,
+    "capture_engine": "recorder",
+    "dc_removal": False,
+    "preroll_seconds": 0,
+    "warm_pipeline": False,
+    "input_device_id": "",
+    "normalize": "off",
+    "target_lufs": -16,
+    "peak_ceiling_db": -1.0,
+    "limiter": True,
+    "compressor": False,
+    "compressor_threshold_db": -24,
+    "compressor_ratio": 3.0,
+    "trim_silence": False,
+    "trim_padding_ms": 250,
+    "auto_stop": False,
+    "auto_stop_silence_ms": 1500,
+    "sample_rate": 0,
+    "channels": 0,
+    "bit_depth": 0,
+    "auto_mono": True,
+    "output_format": "wav",
+    "bitrate_kbps": 0,
+    "filename_template": DEFAULT_TEMPLATE,
+    "content_naming": False,
+    "history_size": 50,
+    "record_shortcut": DEFAULT_RECORD_SHORTCUT,
+    "play_shortcut": DEFAULT_PLAY_SHORTCUT,
+    "play_second_shortcut": DEFAULT_PLAY_SECOND_SHORTCUT,
+    "play_third_shortcut": DEFAULT_PLAY_THIRD_SHORTCUT,
+    "history_back_shortcut": DEFAULT_HISTORY_BACK_SHORTCUT,
+    "history_forward_shortcut": DEFAULT_HISTORY_FORWARD_SHORTCUT,
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    __slots__ = (
+        "save_dir",
+        "gain",
+        "capture_engine",
+        "dc_removal",
+        "preroll_seconds",
+        "warm_pipeline",
+        "input_device_id",
+        "normalize",
+        "target_lufs",
+        "peak_ceiling_db",
+        "limiter",
+        "compressor",
+        "compressor_threshold_db",
+        "compressor_ratio",
+        "trim_silence",
+        "trim_padding_ms",
+        "auto_stop",
+        "auto_stop_silence_ms",
+        "sample_rate",
+        "channels",
+        "bit_depth",
+        "auto_mono",
+        "output_format",
+        "bitrate_kbps",
+        "filename_template",
+        "content_naming",
+        "history_size",
+        "record_shortcut",
+        "play_shortcut",
+        "play_second_shortcut",
+        "play_third_shortcut",
+        "history_back_shortcut",
+        "history_forward_shortcut",
+    )
+
+    # None means the collection media folder.
+    save_dir: Path | None
+    gain: float
+    # "recorder" = QMediaRecorder + post-processing, "pcm" = live QAudioSource.
+    capture_engine: str
+    dc_removal: bool
+    preroll_seconds: float
+    warm_pipeline: bool
+    # Empty means follow the system default input.
+    input_device_id: str
+    # "off", "peak" or "loudness"; replaces the fixed gain when enabled.
+    normalize: str
+    target_lufs: float
+    peak_ceiling_db: float
+    # Soft-limit to peak_ceiling_db instead of hard-clipping after gain.
+    limiter: bool
+    compressor: bool
+    compressor_threshold_db: float
+    compressor_ratio: float
+    # Cut leading/trailing silence after stop, keeping trim_padding_ms of it.
+    trim_silence: bool
+    trim_padding_ms: float
+    # Stop on its own once auto_stop_silence_ms of quiet follow speech.
+    auto_stop: bool
+    auto_stop_silence_ms: float
+    # Stored format; 0 keeps whatever the device or backend delivers.
+    sample_rate: int
+    channels: int
+    bit_depth: int
+    # With channels 0: store takes whose channels are duplicates or silent as mono.
+    auto_mono: bool
+    # Preference order from OUTPUT_FORMATS; the first one usable for a take wins.
+    output_format: tuple[str, ...]
+    # Bitrate for the backend's compressed formats; 0 = its quality default.
+    bitrate_kbps: int
+    # Validated naming.Namer template; always contains {seq}.
+    filename_template: str
+    # Rename each take to a hash of its audio and keep one copy of duplicates.
+    content_naming: bool
+    # Recent takes kept for play-Nth-last and stepping through the history.
+    history_size: int
+    record_shortcut: str
+    play_shortcut: str
+    play_second_shortcut: str
+    play_third_shortcut: str
+    history_back_shortcut: str
+    history_forward_shortcut: str
+
+    @classmethod
+    def from_config(cls, config: dict) -> Settings:
+        raw_dir = str(config.get("save_dir", "")).strip()
+        engine = str(config.get("capture_engine", "recorder")).strip().lower()
+        normalize = str(config.get("normalize", "off")).strip().lower()
+        return cls(
+            save_dir=Path(raw_dir) if raw_dir else None,
+            # Keep gain within a safe range to avoid clipping.
+            gain=_clamped_float(config.get("gain"), 1.25, 0.1, 5.0),
+            capture_engine=engine if engine in ("recorder", "pcm") else "recorder",
+            dc_removal=bool(config.get("dc_removal", False)),
+            # Bounded so the preallocated ring buffer stays small (30 s is a few MB).
+            preroll_seconds=_clamped_float(config.get("preroll_seconds"), 0.0, 0.0, 30.0),
+            warm_pipeline=bool(config.get("warm_pipeline", False)),
+            input_device_id=str(config.get("input_device_id", "")).strip(),
+            normalize=normalize if normalize in ("off", "peak", "loudness") else "off",
+            target_lufs=_clamped_float(config.get("target_lufs"), -16.0, -40.0, -5.0),
+            peak_ceiling_db=_clamped_float(config.get("peak_ceiling_db"), -1.0, -20.0, 0.0),
+            limiter=bool(config.get("limiter", True)),
+            compressor=bool(config.get("compressor", False)),
+            compressor_threshold_db=_clamped_float(config.get("compressor_threshold_db"), -24.0, -60.0, 0.0),
+            compressor_ratio=_clamped_float(config.get("compressor_ratio"), 3.0, 1.0, 20.0),
+            trim_silence=bool(config.get("trim_silence", False)),
+            trim_padding_ms=_clamped_float(config.get("trim_padding_ms"), 250.0, 0.0, 2000.0),
+            auto_stop=bool(config.get("auto_stop", False)),
+            auto_stop_silence_ms=_clamped_float(config.get("auto_stop_silence_ms"), 1500.0, 300.0, 10000.0),
+            sample_rate=_sample_rate(config.get("sample_rate")),
+            channels=_one_of(config.get("channels"), (0, 1, 2)),
+            bit_depth=_one_of(config.get("bit_depth"), (0, 8, 16, 24, 32)),
+            auto_mono=bool(config.get("auto_mono", True)),
+            output_format=_output_formats(config.get("output_format")),
+            bitrate_kbps=_bitrate(config.get("bitrate_kbps")),
+            filename_template=_filename_template(config.get("filename_template")),
+            content_naming=bool(config.get("content_naming", False)),
+            history_size=int(_clamped_float(config.get("history_size"), 50.0, 1.0, 1000.0)),
+            record_shortcut=_shortcut(config.get("record_shortcut"), DEFAULT_RECORD_SHORTCUT),
+            play_shortcut=_shortcut(config.get("play_shortcut"), DEFAULT_PLAY_SHORTCUT),
+            play_second_shortcut=_shortcut(config.get("play_second_shortcut"), DEFAULT_PLAY_SECOND_SHORTCUT),
+            play_third_shortcut=_shortcut(config.get("play_third_shortcut"), DEFAULT_PLAY_THIRD_SHORTCUT),
+            history_back_shortcut=_shortcut(config.get("history_back_shortcut"), DEFAULT_HISTORY_BACK_SHORTCUT),
+            history_forward_shortcut=_shortcut(
+                config.get("history_forward_shortcut"), DEFAULT_HISTORY_FORWARD_SHORTCUT
+            ),
+        )
+
+
+_settings: Settings | None = None
+
+
+# Returns add-on's ID by asking Anki's add-on manager to look up the module name
+def addon_id() -> str:
+    # addonFromModule only looks at the top-level package name.
+    return mw.addonManager.addonFromModule(__name__)
+
+
+def get_config() -> dict:
+    config = mw.addonManager.getConfig(addon_id())
+    if config is None:
+        # First-run defaults are stored back into Anki's config store.
+        config = dict(DEFAULT_CONFIG)
+        write_config(config)
+    return config
+
+
+# That helper writes your add‑on’s config in a way that works across Anki versions.
+def write_config(config: dict) -> None:
+    if hasattr(mw.addonManager, "writeConfig"):
+        mw.addonManager.writeConfig(addon_id(), config)
+    else:
+        mw.addonManager.setConfig(addon_id(), config)
+    invalidate()
+
+
+def settings() -> Settings:
+    """Parsed config, loaded on first use and cached until invalidated."""
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_config(get_config())
+    return _settings
+
+
+def invalidate() -> None:
+    global _settings
+    _settings = None
+
+
+def get_save_dir() -> Path:
+    save_dir = settings().save_dir
+    if save_dir is not None:
+        return save_dir
+    # Fall back to the collection media directory.
+    return Path(mw.col.media.dir())
+
+
+def is_valid_shortcut(text: str) -> bool:
+    return not QKeySequence(text).isEmpty()
+
+
+def _shortcut(value: object, default: str) -> str:
+    raw = str(value if value is not None else default).strip()
+    if raw and is_valid_shortcut(raw):
+        return QKeySequence(raw).toString()
+    return default
+
+
+def _clamped_float(value: object, default: float, low: float, high: float) -> float:
+    try:
+        number = float(value if value is not None else default)
+    except (TypeError, ValueError):
+        number = default
+    return min(high, max(low, number))
+
+
+def _one_of(value: object, allowed: tuple[int, ...]) -> int:
+    # Anything unexpected falls back to the first choice.
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return allowed[0]
+    return number if number in allowed else allowed[0]
+
+
+def _sample_rate(value: object) -> int:
+    rate = int(_clamped_float(value, 0.0, 0.0, 192000.0))
+    return max(8000, rate) if rate else 0
+
+
+def _bitrate(value: object) -> int:
+    kbps = int(_clamped_float(value, 0.0, 0.0, 320.0))
+    return max(16, kbps) if kbps else 0
+
+
+def _filename_template(value: object) -> str:
+    try:
+        return check_template(str(value if value is not None else DEFAULT_TEMPLATE))
+    except ValueError:
+        return DEFAULT_TEMPLATE
+
+
+def _output_formats(value: object) -> tuple[str, ...]:
+    # A single name or a list of them; unknown names are dropped.
+    items = value if isinstance(value, list) else [value]
+    names = (str(item).strip().lower() for item in items if item is not None)
+    return tuple(dict.fromkeys(name for name in names if name in OUTPUT_FORMATS)) or ("wav",)
@@ -0,0 +1,168 @@
+"""Content-addressed names for takes, so identical recordings are stored once.
+
+A take's key is a BLAKE2b digest of its samples together with their format
+(width, channels, rate), so the same audio gets the same key whether it is
+stored as WAV or FLAC. Files that aren't PCM (takes the backend compressed
+while recording) are keyed by their bytes instead.
+
+``HashIndex`` remembers which file holds each key, per directory. It is an
+append-only journal of ``digest<TAB>path`` lines, read once on first use;
+entries whose file has gone are ignored. It is only used from the
+post-processing thread.
+
+``find_duplicates`` applies the same keys to files already in a folder,
+such as recordings imported twice, hashing only files whose format and
+length already match another's.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+import hashlib
+from pathlib import Path
+import struct
+from typing import Hashable, Mapping
+
+from . import flac
+from .wavproc import read_layout
+
+# 80 bits: collisions are out of the question for a media folder.
+DIGEST_SIZE = 10
+NAME_PREFIX = "voice_"
+READ_SIZE = 1 << 20
+
+
+def pcm_hasher(width: int, channels: int, rate: int) -> hashlib.blake2b:
+    """A hasher primed with the sample format; feed it the PCM bytes.
+
+    The post-processing job feeds it from ``library.measure_wav``, which
+    reads the samples anyway.
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b"voice-pcm")
+    hasher.update(struct.pack("<HHI", width, channels, rate))
+    return hasher
+
+
+def file_digest(path: Path) -> str:
+    """Key of any other file: all of its bytes."""
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b"voice-file")
+    with open(path, "rb") as handle:
+        while chunk := handle.read(READ_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def content_name(digest: str, suffix: str) -> str:
+    return f"{NAME_PREFIX}{digest}{suffix}"
+
+
+def audio_digest(path: Path) -> str:
+    """Key of a file already on disk, the same one ``store`` gives a new take.
+
+    Raises ``ValueError`` for a WAV or FLAC too broken to read.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".flac":
+        info, pcm = flac.decode(path)
+        hasher = pcm_hasher(info.sampwidth, info.channels, info.rate)
+        hasher.update(pcm)
+        return hasher.hexdigest()
+    if suffix == ".wav":
+        layout = read_layout(path)
+        if layout.is_pcm:
+            hasher = pcm_hasher(layout.sampwidth, layout.channels, layout.rate)
+            # Whole frames only, as measure_wav hashes them.
+            remaining = layout.data_size - layout.data_size % layout.block_align
+            with open(path, "rb") as handle:
+                handle.seek(layout.data_offset)
+                while remaining > 0 and (chunk := handle.read(min(READ_SIZE, remaining))):
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+            return hasher.hexdigest()
+    return file_digest(path)
+
+
+def find_duplicates(candidates: Mapping[Path, Hashable]) -> dict[str, list[Path]]:
+    """Files in ``candidates`` that hold the same audio, by key.
+
+    ``candidates`` maps each file to something identical copies must share,
+    such as its probed format and length; only files sharing it are read.
+    Each list starts with the file to keep: one already under its content
+    name, else the oldest.
+    """
+    by_shape: dict[Hashable, list[Path]] = defaultdict(list)
+    for path, shape in candidates.items():
+        by_shape[shape].append(path)
+    found: dict[str, list[Path]] = {}
+    for paths in by_shape.values():
+        if len(paths) < 2:
+            continue
+        by_digest: dict[str, list[Path]] = defaultdict(list)
+        for path in paths:
+            try:
+                by_digest[audio_digest(path)].append(path)
+            except (OSError, ValueError):
+                continue
+        for digest, same in by_digest.items():
+            if len(same) > 1:
+                same.sort(key=lambda path: (not path.name.startswith(NAME_PREFIX + digest), path.stat().st_mtime))
+                found[digest] = same
+    return found
+
+
+class HashIndex:
+    """Digest -> stored file, per directory, persisted as a journal."""
+
+    def __init__(self, journal: Path) -> None:
+        self.journal = journal
+        self._entries: dict[tuple[str, str], Path] | None = None
+
+    def lookup(self, digest: str, directory: Path) -> Path | None:
+        """The file in ``directory`` holding ``digest``, if it still exists."""
+        path = self._load().get((str(directory), digest))
+        if path is not None and path.exists():
+            return path
+        return None
+
+    def add(self, digest: str, path: Path) -> None:
+        self._load()[(str(path.parent), digest)] = path
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal, "a", encoding="utf-8") as handle:
+            handle.write(f"{digest}\t{path}\n")
+
+    def _load(self) -> dict[tuple[str, str], Path]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.journal, encoding="utf-8") as handle:
+                    for line in handle:
+                        digest, _, name = line.rstrip("\n").partition("\t")
+                        if name:
+                            path = Path(name)
+                            # Later lines win, so a moved file is found at its new place.
+                            self._entries[(str(path.parent), digest)] = path
+            except FileNotFoundError:
+                pass
+        return self._entries
+
+
+def store(path: Path, digest: str, index: HashIndex) -> tuple[Path, bool]:
+    """Give ``path`` its content name, or drop it if the content is already stored.
+
+    Returns the path that now holds the take and whether it was a duplicate.
+    """
+    existing = index.lookup(digest, path.parent)
+    if existing is None:
+        # Also catches a file stored before the journal was lost.
+        named = path.with_name(content_name(digest, path.suffix))
+        if named.exists() and named != path:
+            existing = named
+            index.add(digest, named)
+    if existing is not None and existing != path:
+        path.unlink()
+        return existing, True
+    target = path.with_name(content_name(digest, path.suffix))
+    if target != path:
+        path.replace(target)
+    index.add(digest, target)
+    return target, False
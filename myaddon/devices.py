@@ -0,0 +1,69 @@
+"""Audio input discovery that follows hot-plug events.
+
+The device list is cached, so only the first pass and hot-plug events pay
+for asking the audio server. ``QMediaDevices`` reports plugging and
+unplugging through ``audioInputsChanged``, which triggers a fresh
+enumeration and then ``changed``. Everything runs on the GUI thread: Qt
+doesn't document the QtMultimedia device APIs as safe elsewhere, and some
+backends (PulseAudio, CoreAudio) touch GUI-thread objects from them.
+"""
+
+from __future__ import annotations
+
+from aqt.qt import QObject, QTimer, pyqtSignal
+from PyQt6.QtMultimedia import QAudioDevice, QMediaDevices
+
+
+def device_id(device: QAudioDevice) -> str:
+    return bytes(device.id()).decode("utf-8", "replace")
+
+
+class DeviceManager(QObject):
+    """Cached list of audio inputs, refreshed when devices come and go."""
+
+    # Emitted after the cached device list was replaced.
+    changed = pyqtSignal()
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._inputs: list[QAudioDevice] | None = None
+        self._default: QAudioDevice | None = None
+        self._media_devices = QMediaDevices(self)
+        self._media_devices.audioInputsChanged.connect(self.refresh)
+        # First pass once control is back in the event loop, so building the
+        # recorder doesn't wait on the audio server.
+        QTimer.singleShot(0, self._first_refresh)
+
+    @property
+    def ready(self) -> bool:
+        """True once a device list is cached."""
+        return self._inputs is not None
+
+    def refresh(self) -> None:
+        self._store(QMediaDevices.audioInputs(), QMediaDevices.defaultAudioInput())
+        self.changed.emit()
+
+    def inputs(self) -> list[QAudioDevice]:
+        if self._inputs is None:
+            # Asked before the deferred first pass ran; do it now instead.
+            self._store(QMediaDevices.audioInputs(), QMediaDevices.defaultAudioInput())
+        return list(self._inputs)
+
+    def select(self, preferred_id: str = "") -> QAudioDevice | None:
+        """The pinned device if it's plugged in, else the system default."""
+        inputs = self.inputs()
+        if preferred_id:
+            for device in inputs:
+                if device_id(device) == preferred_id:
+                    return device
+        if self._default is not None and not self._default.isNull():
+            return self._default
+        return inputs[0] if inputs else None
+
+    def _first_refresh(self) -> None:
+        if self._inputs is None:
+            self.refresh()
+
+    def _store(self, inputs: list[QAudioDevice], default: QAudioDevice) -> None:
+        self._inputs = list(inputs)
+        self._default = None if default.isNull() else default
@@ -0,0 +1,100 @@
+"""Spot multichannel takes that are really mono.
+
+Many USB microphones deliver two channels where one is silent or both carry
+the same signal. ``survey`` reads a handful of blocks spread over the take
+(never the whole file) and measures each channel's level and how far each
+channel differs from the loudest one. ``mono_weights`` turns that into mix
+weights for ``stages.Remix``, or ``None`` when the channels really differ.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+from pathlib import Path
+
+from . import dsp
+from .wavproc import WavLayout, read_layout
+
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_FRAMES = 4096
+# A channel this far below the loudest one carries nothing worth keeping.
+DEAD_CHANNEL_DB = -40.0
+# Channels whose difference is this far below the signal are duplicates.
+DUPLICATE_DB = -40.0
+# Below this the take is silence and there is nothing to decide.
+SILENCE_DBFS = -70.0
+
+
+@dataclass(frozen=True)
+class ChannelSurvey:
+    # RMS of each channel over the sampled blocks.
+    levels: tuple[float, ...]
+    # RMS of (channel - loudest channel) for each channel.
+    differences: tuple[float, ...]
+    full_scale: int
+
+
+def survey(path: Path, layout: WavLayout | None = None, backend: dsp.Backend | None = None) -> ChannelSurvey:
+    """Measure ``SAMPLE_BLOCKS`` evenly spaced blocks of ``path``."""
+    backend = backend or dsp.get_backend()
+    if layout is None:
+        layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    channels, width = layout.channels, layout.sampwidth
+    total = layout.data_size // layout.block_align
+    block = min(total, SAMPLE_BLOCK_FRAMES)
+    count = min(SAMPLE_BLOCKS, total // block) if block else 0
+    starts = [round(i * (total - block) / max(1, count - 1)) for i in range(count)]
+    data = bytearray()
+    with open(path, "rb") as handle:
+        for start in starts:
+            handle.seek(layout.data_offset + start * layout.block_align)
+            data += handle.read(block * layout.block_align)
+    data = bytes(data)
+
+    def one_hot(channel: int, minus: int | None = None) -> tuple[float, ...]:
+        weights = [0.0] * channels
+        weights[channel] = 1.0
+        if minus is not None:
+            weights[minus] -= 1.0
+        return tuple(weights)
+
+    levels = tuple(backend.rms(backend.mix_down(data, width, one_hot(c)), width) for c in range(channels))
+    loudest = max(range(channels), key=levels.__getitem__)
+    differences = tuple(
+        backend.rms(backend.mix_down(data, width, one_hot(c, loudest)), width) if c != loudest else 0.0
+        for c in range(channels)
+    )
+    return ChannelSurvey(levels, differences, dsp.sample_limits(width)[1])
+
+
+def mono_weights(result: ChannelSurvey) -> tuple[float, ...] | None:
+    """Mix weights that fold the take to mono without losing anything, or ``None``.
+
+    Dead channels get weight 0. The remaining ones are averaged if they are
+    duplicates of each other (or there is only one).
+    """
+    loud = max(result.levels)
+    if len(result.levels) < 2 or loud <= result.full_scale * _ratio(SILENCE_DBFS):
+        return None
+    live = [level >= loud * _ratio(DEAD_CHANNEL_DB) for level in result.levels]
+    duplicates = all(
+        diff <= loud * _ratio(DUPLICATE_DB) for diff, alive in zip(result.differences, live) if alive
+    )
+    if not duplicates:
+        return None
+    share = 1.0 / sum(live)
+    return tuple(share if alive else 0.0 for alive in live)
+
+
+def describe(weights: tuple[float, ...]) -> str:
+    kept = [str(c + 1) for c, weight in enumerate(weights) if weight]
+    if len(kept) == len(weights):
+        return "duplicate channels averaged"
+    return f"kept channel {', '.join(kept)} (others silent)"
+
+
+def _ratio(db: float) -> float:
+    return math.pow(10, db / 20)
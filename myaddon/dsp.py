@@ -0,0 +1,509 @@
+"""Sample-level DSP backends for post-processing.
+
+Fragments are raw little-endian PCM bytes as stored in a WAV ``data`` chunk:
+8-bit samples are unsigned, wider ones are signed. Three interchangeable
+backends are provided and :func:`get_backend` picks the fastest available:
+
+- ``numpy``: vectorized, used whenever NumPy can be imported.
+- ``audioop``: the C stdlib module, gone as of Python 3.13.
+- ``array``: pure stdlib fallback built on ``array``/``memoryview``.
+"""
+
+from __future__ import annotations
+
+from array import array
+import math
+import sys
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:
+    audioop = None
+
+SUPPORTED_WIDTHS = (1, 2, 3, 4)
+
+
+def sample_limits(width: int) -> tuple[int, int]:
+    bits = 8 * width
+    return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+
+
+def _check_width(width: int) -> None:
+    if width not in SUPPORTED_WIDTHS:
+        raise ValueError(f"unsupported sample width {width}")
+
+
+class Backend:
+    """Operations every post-processing stage may rely on."""
+
+    name = "base"
+
+    def mul(self, data: bytes, width: int, factor: float) -> bytes:
+        """Scale every sample by ``factor``, saturating at full scale."""
+        raise NotImplementedError
+
+    def peak(self, data: bytes, width: int) -> int:
+        """Largest absolute sample value."""
+        raise NotImplementedError
+
+    def rms(self, data: bytes, width: int) -> float:
+        """Root mean square of all samples (``audioop``: to within one LSB)."""
+        raise NotImplementedError
+
+    def mean(self, data: bytes, width: int) -> float:
+        """Arithmetic mean of all samples (the DC offset; ``audioop``: to within one LSB)."""
+        raise NotImplementedError
+
+    def add(self, data: bytes, width: int, offset: int) -> bytes:
+        """Add ``offset`` to every sample, saturating at full scale."""
+        raise NotImplementedError
+
+    def remix(self, data: bytes, width: int, channels: int, out_channels: int) -> bytes:
+        """Change the channel count of interleaved ``data``.
+
+        Several channels down to one are averaged; one channel up to several
+        is copied. Any other combination keeps or repeats the leading channels.
+        """
+        values = ArrayBackend.decode(data, width)
+        frames = len(values) // channels
+        if out_channels == 1:
+            scale = 1.0 / channels
+            floor = math.floor
+            mixed = [floor(sum(values[i * channels : (i + 1) * channels]) * scale) for i in range(frames)]
+        else:
+            picks = [c % channels for c in range(out_channels)]
+            mixed = [values[i * channels + c] for i in range(frames) for c in picks]
+        return ArrayBackend.encode(mixed, width)
+
+    def mix_down(self, data: bytes, width: int, weights: tuple[float, ...]) -> bytes:
+        """Mono fragment: each frame's channels weighted by ``weights`` and summed."""
+        channels = len(weights)
+        lo, hi = sample_limits(width)
+        floor = math.floor
+        values = ArrayBackend.decode(data, width)
+        mixed = []
+        for i in range(0, len(values) - channels + 1, channels):
+            total = 0.0
+            for c, weight in enumerate(weights):
+                total += values[i + c] * weight
+            mixed.append(min(hi, max(lo, floor(total))))
+        return ArrayBackend.encode(mixed, width)
+
+    def convert_width(self, data: bytes, width: int, out_width: int) -> bytes:
+        """Re-encode samples at ``out_width`` bytes, keeping them at the same level."""
+        if out_width == width:
+            return data
+        shift = 8 * (out_width - width)
+        values = ArrayBackend.decode(data, width)
+        if shift > 0:
+            return ArrayBackend.encode([v << shift for v in values], out_width)
+        return ArrayBackend.encode([v >> -shift for v in values], out_width)
+
+    # Grouped operations work on consecutive runs of ``group`` samples (the
+    # last run may be shorter). Block-based stages use them to compute an
+    # envelope at a coarser rate than the samples. The defaults slice and call
+    # the per-fragment operations; vectorized backends override them.
+
+    def group_peaks(self, data: bytes, width: int, group: int) -> list[int]:
+        step = group * width
+        return [self.peak(data[i : i + step], width) for i in range(0, len(data), step)]
+
+    def group_rms(self, data: bytes, width: int, group: int) -> list[float]:
+        step = group * width
+        return [self.rms(data[i : i + step], width) for i in range(0, len(data), step)]
+
+    def mul_groups(self, data: bytes, width: int, gains: list[float], group: int) -> bytes:
+        """Scale each run of ``group`` samples by its own gain."""
+        step = group * width
+        return b"".join(self.mul(data[i * step : (i + 1) * step], width, g) for i, g in enumerate(gains))
+
+    def count_over(self, data: bytes, width: int, threshold: int) -> int:
+        """Number of samples whose magnitude is at least ``threshold``."""
+        return sum(1 for v in ArrayBackend.decode(data, width) if abs(v) >= threshold)
+
+    def group_crossings(self, data: bytes, width: int, group: int, channels: int = 1) -> list[int]:
+        """Sign changes inside each run of ``group`` samples, summed over channels.
+
+        ``group`` must be a multiple of ``channels``. Changes across the
+        boundary between two runs are not counted.
+        """
+        values = ArrayBackend.decode(data, width)
+        out = []
+        for i in range(0, len(values), group):
+            run = values[i : i + group]
+            count = 0
+            for channel in range(channels):
+                samples = run[channel::channels]
+                count += sum(1 for a, b in zip(samples, samples[1:]) if (a < 0) != (b < 0))
+            out.append(count)
+        return out
+
+
+class AudioopBackend(Backend):
+    name = "audioop"
+
+    def mul(self, data: bytes, width: int, factor: float) -> bytes:
+        _check_width(width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+            return audioop.bias(audioop.mul(data, 1, factor), 1, 128)
+        return audioop.mul(data, width, factor)
+
+    def peak(self, data: bytes, width: int) -> int:
+        _check_width(width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        return audioop.max(data, width)
+
+    # audioop.rms and audioop.avg truncate to integers, so these can sit up to
+    # one LSB below the other backends; that is far below anything audible.
+
+    def rms(self, data: bytes, width: int) -> float:
+        _check_width(width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        return float(audioop.rms(data, width))
+
+    def mean(self, data: bytes, width: int) -> float:
+        _check_width(width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        return float(audioop.avg(data, width))
+
+    def add(self, data: bytes, width: int, offset: int) -> bytes:
+        _check_width(width)
+        lo, hi = sample_limits(width)
+        # Anything beyond the full range saturates every sample anyway.
+        offset = min(hi - lo, max(lo - hi, offset))
+        if not offset or not data:
+            return data
+        out = data[: len(data) - len(data) % width]
+        if width == 1:
+            out = audioop.bias(out, 1, -128)
+        # audioop.bias wraps on overflow but audioop.add saturates, so add
+        # constant fragments instead, in steps a sample can represent.
+        while offset:
+            step = min(hi, max(lo, offset))
+            constant = audioop.bias(bytes(len(out)), width, step)
+            out = audioop.add(out, constant, width)
+            offset -= step
+        if width == 1:
+            out = audioop.bias(out, 1, 128)
+        return out
+
+    def remix(self, data: bytes, width: int, channels: int, out_channels: int) -> bytes:
+        if (channels, out_channels) not in ((2, 1), (1, 2)):
+            return super().remix(data, width, channels, out_channels)
+        _check_width(width)
+        data = data[: len(data) - len(data) % (width * channels)]
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        if channels == 2:
+            out = audioop.tomono(data, width, 0.5, 0.5)
+        else:
+            out = audioop.tostereo(data, width, 1, 1)
+        if width == 1:
+            out = audioop.bias(out, 1, 128)
+        return out
+
+    def mix_down(self, data: bytes, width: int, weights: tuple[float, ...]) -> bytes:
+        if len(weights) != 2:
+            return super().mix_down(data, width, weights)
+        _check_width(width)
+        data = data[: len(data) - len(data) % (2 * width)]
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        out = audioop.tomono(data, width, *weights)
+        if width == 1:
+            out = audioop.bias(out, 1, 128)
+        return out
+
+    def convert_width(self, data: bytes, width: int, out_width: int) -> bytes:
+        if out_width == width:
+            return data
+        _check_width(width)
+        _check_width(out_width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        out = audioop.lin2lin(data, width, out_width)
+        if out_width == 1:
+            out = audioop.bias(out, 1, 128)
+        return out
+
+    def group_crossings(self, data: bytes, width: int, group: int, channels: int = 1) -> list[int]:
+        if channels != 1:
+            return super().group_crossings(data, width, group, channels)
+        _check_width(width)
+        if width == 1:
+            data = audioop.bias(data, 1, -128)
+        step = group * width
+        return [audioop.cross(data[i : i + step], width) for i in range(0, len(data), step)]
+
+
+class ArrayBackend(Backend):
+    name = "array"
+
+    def mul(self, data: bytes, width: int, factor: float) -> bytes:
+        lo, hi = sample_limits(width)
+        floor = math.floor
+        # Round toward -inf like audioop so every backend produces the same bytes.
+        scaled = [min(hi, max(lo, floor(v * factor))) for v in self.decode(data, width)]
+        return self.encode(scaled, width)
+
+    def peak(self, data: bytes, width: int) -> int:
+        values = self.decode(data, width)
+        if not values:
+            return 0
+        return max(abs(min(values)), abs(max(values)))
+
+    def rms(self, data: bytes, width: int) -> float:
+        values = self.decode(data, width)
+        if not values:
+            return 0.0
+        return math.sqrt(math.fsum(v * v for v in values) / len(values))
+
+    def mean(self, data: bytes, width: int) -> float:
+        values = self.decode(data, width)
+        if not values:
+            return 0.0
+        return sum(values) / len(values)
+
+    def add(self, data: bytes, width: int, offset: int) -> bytes:
+        if not offset:
+            return data
+        lo, hi = sample_limits(width)
+        return self.encode([min(hi, max(lo, v + offset)) for v in self.decode(data, width)], width)
+
+    def group_peaks(self, data: bytes, width: int, group: int) -> list[int]:
+        values = self.decode(data, width)
+        return [max(map(abs, values[i : i + group])) for i in range(0, len(values), group)]
+
+    def group_rms(self, data: bytes, width: int, group: int) -> list[float]:
+        values = self.decode(data, width)
+        out = []
+        for i in range(0, len(values), group):
+            run = values[i : i + group]
+            out.append(math.sqrt(math.fsum(v * v for v in run) / len(run)))
+        return out
+
+    def mul_groups(self, data: bytes, width: int, gains: list[float], group: int) -> bytes:
+        lo, hi = sample_limits(width)
+        floor = math.floor
+        values = self.decode(data, width)
+        scaled = [min(hi, max(lo, floor(v * gains[i // group]))) for i, v in enumerate(values)]
+        return self.encode(scaled, width)
+
+    @staticmethod
+    def decode(data: bytes, width: int) -> array | list[int]:
+        """Samples as Python ints (8-bit re-centred around zero)."""
+        _check_width(width)
+        count = len(data) // width
+        data = memoryview(data)[: count * width]
+        if width == 1:
+            return [v - 128 for v in data]
+        if width == 3:
+            # Widen to 32-bit by placing each 24-bit sample in the top three
+            # bytes of a word, then shift back down after decoding.
+            widened = bytearray(count * 4)
+            widened[1::4] = data[0::3]
+            widened[2::4] = data[1::3]
+            widened[3::4] = data[2::3]
+            values = array("i")
+            values.frombytes(widened)
+            if sys.byteorder == "big":
+                values.byteswap()
+            return [v >> 8 for v in values]
+        values = array("h" if width == 2 else "i")
+        values.frombytes(data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    @staticmethod
+    def encode(values: list[int], width: int) -> bytes:
+        """Inverse of :meth:`decode`; ``values`` must already be in range."""
+        if width == 1:
+            return bytes(v + 128 for v in values)
+        if width == 3:
+            packed = array("i", [v << 8 for v in values])
+            if sys.byteorder == "big":
+                packed.byteswap()
+            widened = memoryview(packed).cast("B")
+            out = bytearray(len(values) * 3)
+            out[0::3] = widened[1::4]
+            out[1::3] = widened[2::4]
+            out[2::3] = widened[3::4]
+            return bytes(out)
+        packed = array("h" if width == 2 else "i", values)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        return packed.tobytes()
+
+
+class NumpyBackend(Backend):
+    name = "numpy"
+
+    def mul(self, data: bytes, width: int, factor: float) -> bytes:
+        lo, hi = sample_limits(width)
+        values = self.decode(data, width).astype(np.float64)
+        values *= factor
+        np.floor(values, out=values)
+        np.clip(values, lo, hi, out=values)
+        return self.encode(values.astype(np.int32), width)
+
+    def peak(self, data: bytes, width: int) -> int:
+        values = self.decode(data, width)
+        if not values.size:
+            return 0
+        return max(-int(values.min()), int(values.max()))
+
+    def rms(self, data: bytes, width: int) -> float:
+        values = self.decode(data, width)
+        if not values.size:
+            return 0.0
+        values = values.astype(np.float64)
+        return float(np.sqrt(np.dot(values, values) / values.size))
+
+    def mean(self, data: bytes, width: int) -> float:
+        values = self.decode(data, width)
+        if not values.size:
+            return 0.0
+        return float(values.mean(dtype=np.float64))
+
+    def add(self, data: bytes, width: int, offset: int) -> bytes:
+        if not offset:
+            return data
+        lo, hi = sample_limits(width)
+        values = self.decode(data, width).astype(np.int64) + offset
+        np.clip(values, lo, hi, out=values)
+        return self.encode(values, width)
+
+    def group_peaks(self, data: bytes, width: int, group: int) -> list[int]:
+        values = np.abs(self.decode(data, width).astype(np.int64))
+        return np.maximum.reduceat(values, np.arange(0, values.size, group)).tolist() if values.size else []
+
+    def group_rms(self, data: bytes, width: int, group: int) -> list[float]:
+        values = self.decode(data, width).astype(np.float64)
+        if not values.size:
+            return []
+        starts = np.arange(0, values.size, group)
+        sums = np.add.reduceat(values * values, starts)
+        counts = np.diff(np.append(starts, values.size))
+        return np.sqrt(sums / counts).tolist()
+
+    def mul_groups(self, data: bytes, width: int, gains: list[float], group: int) -> bytes:
+        lo, hi = sample_limits(width)
+        values = self.decode(data, width).astype(np.float64)
+        values *= np.repeat(np.asarray(gains, dtype=np.float64), group)[: values.size]
+        np.floor(values, out=values)
+        np.clip(values, lo, hi, out=values)
+        return self.encode(values.astype(np.int64), width)
+
+    def count_over(self, data: bytes, width: int, threshold: int) -> int:
+        return int(np.count_nonzero(np.abs(self.decode(data, width).astype(np.int64)) >= threshold))
+
+    def remix(self, data: bytes, width: int, channels: int, out_channels: int) -> bytes:
+        values = self.decode(data, width)
+        frames = values[: values.size - values.size % channels].reshape(-1, channels)
+        if out_channels == 1:
+            mixed = np.floor(frames.sum(axis=1, dtype=np.float64) * (1.0 / channels)).astype(np.int64)
+        else:
+            mixed = frames[:, [c % channels for c in range(out_channels)]]
+        return self.encode(mixed.reshape(-1), width)
+
+    def mix_down(self, data: bytes, width: int, weights: tuple[float, ...]) -> bytes:
+        channels = len(weights)
+        lo, hi = sample_limits(width)
+        values = self.decode(data, width)
+        frames = values[: values.size - values.size % channels].reshape(-1, channels).astype(np.float64)
+        # Summed channel by channel, in the same order as the other backends.
+        mixed = np.zeros(len(frames))
+        for c, weight in enumerate(weights):
+            mixed += frames[:, c] * weight
+        np.floor(mixed, out=mixed)
+        np.clip(mixed, lo, hi, out=mixed)
+        return self.encode(mixed.astype(np.int64), width)
+
+    def convert_width(self, data: bytes, width: int, out_width: int) -> bytes:
+        if out_width == width:
+            return data
+        shift = 8 * (out_width - width)
+        values = self.decode(data, width).astype(np.int64)
+        values = values << shift if shift > 0 else values >> -shift
+        return self.encode(values, out_width)
+
+    def group_crossings(self, data: bytes, width: int, group: int, channels: int = 1) -> list[int]:
+        values = self.decode(data, width)
+        frames = values.size // channels
+        if not frames:
+            return []
+        negative = (values[: frames * channels] < 0).reshape(frames, channels)
+        # changes[k] counts crossings between frame k-1 and frame k.
+        changes = np.zeros(frames, dtype=np.int64)
+        changes[1:] = np.count_nonzero(negative[1:] != negative[:-1], axis=1)
+        starts = np.arange(0, frames, group // channels)
+        changes[starts] = 0
+        return np.add.reduceat(changes, starts).tolist()
+
+    @staticmethod
+    def decode(data: bytes, width: int) -> "np.ndarray":
+        """Samples as an ``int32`` array (8-bit re-centred around zero)."""
+        _check_width(width)
+        count = len(data) // width
+        raw = np.frombuffer(data, dtype=np.uint8, count=count * width)
+        if width == 1:
+            return raw.astype(np.int32) - 128
+        if width == 3:
+            widened = np.zeros((count, 4), dtype=np.uint8)
+            widened[:, 1:] = raw.reshape(count, 3)
+            return widened.view("<i4").reshape(count) >> 8
+        return raw.view("<i2" if width == 2 else "<i4").astype(np.int32)
+
+    @staticmethod
+    def encode(values: "np.ndarray", width: int) -> bytes:
+        """Inverse of :meth:`decode`; ``values`` must already be in range."""
+        if width == 1:
+            return (values + 128).astype(np.uint8).tobytes()
+        if width == 3:
+            widened = (values.astype("<i4") << 8).view(np.uint8).reshape(-1, 4)
+            return widened[:, 1:].tobytes()
+        return values.astype("<i2" if width == 2 else "<i4").tobytes()
+
+
+_BACKENDS: dict[str, type[Backend]] = {
+    "numpy": NumpyBackend,
+    "audioop": AudioopBackend,
+    "array": ArrayBackend,
+}
+_default: Backend | None = None
+
+
+def available_backends() -> list[str]:
+    """Names of the backends usable in this interpreter, fastest first."""
+    names = []
+    if np is not None:
+        names.append("numpy")
+    if audioop is not None:
+        names.append("audioop")
+    names.append("array")
+    return names
+
+
+def get_backend(name: str | None = None) -> Backend:
+    """Return the named backend, or the fastest available one when ``None``."""
+    global _default
+    if name is None:
+        if _default is None:
+            _default = _BACKENDS[available_backends()[0]]()
+        return _default
+    if name not in available_backends():
+        raise ValueError(f"DSP backend {name!r} is not available")
+    return _BACKENDS[name]()
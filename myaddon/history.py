@@ -0,0 +1,75 @@
+"""Bounded history of recent takes for "play the Nth last" and stepping.
+
+The ring holds paths only, newest first, in preallocated slots, so every
+lookup is an index calculation and nothing touches the disk until a take is
+actually played. It is filled from the profile's recording index when the
+profile opens, before any new take can be added, which is what makes it
+survive restarts.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+
+class History:
+    """The last ``capacity`` takes, with a cursor for stepping through them."""
+
+    def __init__(self, capacity: int, recent: Iterable[Path] = ()) -> None:
+        if capacity <= 0:
+            raise ValueError("history capacity must be at least 1")
+        self.capacity = capacity
+        self._slots: list[Path | None] = [None] * capacity
+        # Slot of the newest take.
+        self._head = capacity - 1
+        self._size = 0
+        # Age of the take last played from the history; 0 = newest.
+        self.cursor = 0
+        # ``recent`` is newest first, as the index returns it.
+        for path in reversed(list(recent)[:capacity]):
+            self.push(path)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, path: Path) -> None:
+        """Record a finished take as the newest and reset the cursor to it."""
+        self.cursor = 0
+        if self._size and self._slots[self._head] == path:
+            # A duplicate of the last take stored under the same name.
+            return
+        self._head = (self._head + 1) % self.capacity
+        self._slots[self._head] = path
+        self._size = min(self._size + 1, self.capacity)
+
+    def resize(self, capacity: int) -> None:
+        """Change the capacity in memory, keeping the newest takes that fit."""
+        if capacity == self.capacity:
+            return
+        if capacity <= 0:
+            raise ValueError("history capacity must be at least 1")
+        kept = [self.get(age) for age in range(min(self._size, capacity))]
+        # Oldest first, so the newest lands in slot len(kept) - 1.
+        self._slots = kept[::-1] + [None] * (capacity - len(kept))
+        self._head = (len(kept) - 1) % capacity
+        self._size = len(kept)
+        self.capacity = capacity
+        self.cursor = min(self.cursor, max(0, self._size - 1))
+
+    def get(self, age: int) -> Path | None:
+        """The take ``age`` steps back (0 = newest), or None past either end."""
+        if not 0 <= age < self._size:
+            return None
+        return self._slots[(self._head - age) % self.capacity]
+
+    def seek(self, age: int) -> Path | None:
+        """Move the cursor to ``age`` if there is a take there, and return it."""
+        path = self.get(age)
+        if path is not None:
+            self.cursor = age
+        return path
+
+    def step(self, delta: int) -> Path | None:
+        """Move the cursor ``delta`` takes older (negative: newer)."""
+        return self.seek(self.cursor + delta)
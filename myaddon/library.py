@@ -0,0 +1,295 @@
+"""SQLite index of recorded takes, for queries that shouldn't scan the disk.
+
+One row per take: where its file is, when it was recorded, its format,
+length, levels and size, and the note/card/deck it was recorded for. Rows
+are added by the post-processing job once a take is final, so the index
+grows one insert at a time and queries such as "recordings for this deck" or
+"minutes recorded this week" are a single indexed ``SELECT``. Takes that
+``dedup`` stored as one file each keep their own row, so a path can appear
+more than once.
+
+Every call opens its own short-lived connection, so the worker thread and
+the GUI thread can both use one ``RecordingLibrary``; WAL mode keeps
+readers and the writer from blocking each other.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+from pathlib import Path
+import sqlite3
+from typing import TYPE_CHECKING, Mapping
+
+from . import dsp
+from .wavproc import WavLayout, read_layout
+
+if TYPE_CHECKING:
+    import hashlib
+
+    from .probe import AudioInfo
+
+READ_FRAMES = 65536
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    created REAL NOT NULL,
+    duration REAL,
+    rate INTEGER,
+    channels INTEGER,
+    bits INTEGER,
+    peak_db REAL,
+    rms_db REAL,
+    size INTEGER NOT NULL,
+    note_id INTEGER,
+    card_id INTEGER,
+    deck_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS recordings_path ON recordings (path);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created);
+CREATE INDEX IF NOT EXISTS recordings_deck ON recordings (deck_id, created);
+CREATE INDEX IF NOT EXISTS recordings_note ON recordings (note_id);
+"""
+_COLUMNS = "path, created, duration, rate, channels, bits, peak_db, rms_db, size, note_id, card_id, deck_id"
+# Version 1 keyed rows by path, so a deduplicated take replaced the row of
+# the take it matched. Its rows are carried over as they are.
+_MIGRATE_V1 = f"""
+BEGIN;
+DROP INDEX IF EXISTS recordings_created;
+DROP INDEX IF EXISTS recordings_deck;
+DROP INDEX IF EXISTS recordings_note;
+ALTER TABLE recordings RENAME TO recordings_v1;
+{_SCHEMA}
+INSERT INTO recordings ({_COLUMNS}) SELECT {_COLUMNS} FROM recordings_v1;
+DROP TABLE recordings_v1;
+COMMIT;
+"""
+
+
+@dataclass(frozen=True)
+class TakeInfo:
+    """What the recorder knows about a take before it is measured."""
+
+    # time.time() when recording started.
+    created: float
+    note_id: int = 0
+    card_id: int = 0
+    deck_id: int = 0
+    # Reported by the recorder, for files that can't be measured here.
+    duration: float | None = None
+
+
+@dataclass(frozen=True)
+class WavStats:
+    duration: float
+    rate: int
+    channels: int
+    bits: int
+    # dBFS; -inf for digital silence.
+    peak_db: float
+    rms_db: float
+
+
+@dataclass(frozen=True)
+class Recording:
+    path: Path
+    created: float
+    # None where the file couldn't be measured (compressed takes).
+    duration: float | None
+    rate: int | None
+    channels: int | None
+    bits: int | None
+    peak_db: float | None
+    rms_db: float | None
+    size: int
+    note_id: int | None
+    card_id: int | None
+    deck_id: int | None
+
+
+def measure_wav(
+    path: Path,
+    layout: WavLayout | None = None,
+    hasher: hashlib.blake2b | None = None,
+    backend: dsp.Backend | None = None,
+) -> WavStats:
+    """Length, format and levels of a PCM WAV in one streaming pass.
+
+    ``hasher``, if given, is fed the samples on the way (see ``dedup``).
+    """
+    backend = backend or dsp.get_backend()
+    if layout is None:
+        layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    width = layout.sampwidth
+    remaining = layout.data_size - layout.data_size % layout.block_align
+    samples = remaining // width
+    peak = 0
+    energy = 0.0
+    with open(path, "rb") as handle:
+        handle.seek(layout.data_offset)
+        while remaining > 0:
+            chunk = handle.read(min(READ_FRAMES * layout.block_align, remaining))
+            if not chunk:
+                break
+            if hasher is not None:
+                hasher.update(chunk)
+            peak = max(peak, backend.peak(chunk, width))
+            energy += backend.rms(chunk, width) ** 2 * (len(chunk) // width)
+            remaining -= len(chunk)
+    full_scale = dsp.sample_limits(width)[1]
+    rms = math.sqrt(energy / samples) if samples else 0.0
+    return WavStats(
+        duration=samples / layout.channels / layout.rate if layout.rate else 0.0,
+        rate=layout.rate,
+        channels=layout.channels,
+        bits=8 * width,
+        peak_db=_dbfs(peak, full_scale),
+        rms_db=_dbfs(rms, full_scale),
+    )
+
+
+class RecordingLibrary:
+    def __init__(self, database: Path) -> None:
+        self.database = database
+        self._ready = False
+
+    def add(self, path: Path, take: TakeInfo, stats: WavStats | None = None) -> None:
+        """Add a row for ``take``, stored at ``path`` (for a duplicate, the file it matched)."""
+        row = (
+            str(path),
+            take.created,
+            stats.duration if stats is not None else take.duration,
+            stats.rate if stats is not None else None,
+            stats.channels if stats is not None else None,
+            stats.bits if stats is not None else None,
+            _finite(stats.peak_db) if stats is not None else None,
+            _finite(stats.rms_db) if stats is not None else None,
+            path.stat().st_size,
+            take.note_id or None,
+            take.card_id or None,
+            take.deck_id or None,
+        )
+        with self._connect() as db:
+            db.execute(f"INSERT INTO recordings ({_COLUMNS}) VALUES ({', '.join('?' * 12)})", row)
+
+    def add_existing(self, found: Mapping[Path, AudioInfo]) -> int:
+        """Index files recorded before the index existed, from their probed headers.
+
+        Files that already have a row are skipped, since it knows more
+        (levels, note and card). Returns how many rows were added.
+        """
+        rows = []
+        for path, info in found.items():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            row = (str(path), stat.st_mtime, info.duration, info.rate, info.channels, info.bits)
+            rows.append(row + (None, None, stat.st_size, None, None, None, str(path)))
+        with self._connect() as db:
+            before = db.total_changes
+            db.executemany(
+                f"INSERT INTO recordings ({_COLUMNS}) SELECT {', '.join('?' * 12)}"
+                " WHERE NOT EXISTS (SELECT 1 FROM recordings WHERE path = ?)",
+                rows,
+            )
+            return db.total_changes - before
+
+    def move(self, path: Path, to: Path) -> None:
+        """Point every take stored at ``path`` at ``to`` (a file holding the same audio)."""
+        size = to.stat().st_size
+        with self._connect() as db:
+            db.execute("UPDATE recordings SET path = ?, size = ? WHERE path = ?", (str(to), size, str(path)))
+
+    def remove(self, path: Path) -> None:
+        """Drop every take stored at ``path``."""
+        with self._connect() as db:
+            db.execute("DELETE FROM recordings WHERE path = ?", (str(path),))
+
+    def get(self, path: Path) -> Recording | None:
+        """The newest take stored at ``path``."""
+        rows = self._query("WHERE path = ? ORDER BY created DESC LIMIT 1", (str(path),))
+        return rows[0] if rows else None
+
+    def for_deck(self, deck_id: int) -> list[Recording]:
+        return self._query("WHERE deck_id = ? ORDER BY created", (deck_id,))
+
+    def for_note(self, note_id: int) -> list[Recording]:
+        return self._query("WHERE note_id = ? ORDER BY created", (note_id,))
+
+    def since(self, created: float) -> list[Recording]:
+        return self._query("WHERE created >= ? ORDER BY created", (created,))
+
+    def recent(self, limit: int) -> list[Recording]:
+        """The last ``limit`` takes, newest first."""
+        return self._query("ORDER BY created DESC LIMIT ?", (limit,))
+
+    def total_seconds(self, since: float = 0.0, deck_id: int | None = None) -> float:
+        """Recorded time since ``since`` (a ``time.time()`` value), optionally for one deck."""
+        sql = "SELECT COALESCE(SUM(duration), 0) FROM recordings WHERE created >= ?"
+        params: tuple = (since,)
+        if deck_id is not None:
+            sql += " AND deck_id = ?"
+            params += (deck_id,)
+        with self._connect() as db:
+            return db.execute(sql, params).fetchone()[0]
+
+    def count(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def _query(self, clause: str, params: tuple) -> list[Recording]:
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {_COLUMNS} FROM recordings {clause}", params).fetchall()
+        return [Recording(Path(row[0]), *row[1:]) for row in rows]
+
+    def _connect(self) -> _Connection:
+        return _Connection(self)
+
+    def _open(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.database.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.database, timeout=10)
+        if not self._ready:
+            db.execute("PRAGMA journal_mode=WAL")
+            if db.execute("PRAGMA user_version").fetchone()[0] == 1:
+                db.executescript(_MIGRATE_V1)
+            db.executescript(_SCHEMA)
+            db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self._ready = True
+        return db
+
+
+class _Connection:
+    """``with`` block that commits (or rolls back) and always closes."""
+
+    def __init__(self, library: RecordingLibrary) -> None:
+        self._library = library
+        self._db: sqlite3.Connection | None = None
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._db = self._library._open()
+        return self._db
+
+    def __exit__(self, exc_type: object, *exc_info: object) -> None:
+        try:
+            if exc_type is None:
+                self._db.commit()
+            else:
+                self._db.rollback()
+        finally:
+            self._db.close()
+
+
+def _dbfs(level: float, full_scale: int) -> float:
+    return 20 * math.log10(level / full_scale) if level > 0 else -math.inf
+
+
+def _finite(value: float) -> float | None:
+    # SQLite has no infinity literal worth relying on; silence is stored as NULL.
+    return value if math.isfinite(value) else None
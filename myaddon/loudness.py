@@ -0,0 +1,296 @@
+"""Loudness (ITU-R BS.1770 / EBU R128) and true-peak measurement.
+
+``LoudnessMeter`` consumes interleaved PCM blocks in one streaming pass and
+keeps only one float per 100 ms of audio, so memory stays small for long
+takes. With NumPy the K-weighting filter runs as an FFT convolution with its
+(truncated) impulse response and true peak uses 4x polyphase oversampling;
+without NumPy the filter runs sample by sample and true peak falls back to
+the sample peak.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+import math
+from pathlib import Path
+
+from . import dsp
+from .dsp import np
+from .wavproc import read_layout
+
+# Gating parameters from BS.1770-4.
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+STEP_SECONDS = 0.1
+STEPS_PER_BLOCK = 4
+
+# Never boost by more than this, so a take that is mostly room noise isn't
+# pulled up to speech level.
+MAX_NORMALIZE_GAIN_DB = 24.0
+
+OVERSAMPLE = 4
+_TRUE_PEAK_TAPS_PER_PHASE = 12
+
+
+@dataclass(frozen=True)
+class LoudnessStats:
+    # -inf when every block was gated out (silence).
+    integrated_lufs: float
+    true_peak_dbtp: float
+    sample_peak_dbfs: float
+
+
+def to_db(value: float) -> float:
+    return 20 * math.log10(value) if value > 0 else -math.inf
+
+
+def k_weighting_coefficients(rate: int) -> list[tuple[tuple[float, float, float], tuple[float, float]]]:
+    """The two K-weighting biquads as ``((b0, b1, b2), (a1, a2))`` for ``rate``."""
+    # Pre-filter: high shelf modelling the acoustic effect of the head.
+    f0 = 1681.974450955533
+    gain_db = 3.999843853973347
+    q = 0.7071752369554196
+    k = math.tan(math.pi * f0 / rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+    )
+    # RLB weighting: second-order high-pass.
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = math.tan(math.pi * f0 / rate)
+    a0 = 1 + k / q + k * k
+    highpass = ((1.0, -2.0, 1.0), (2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0))
+    return [shelf, highpass]
+
+
+@lru_cache(maxsize=8)
+def _k_weighting_response(rate: int) -> tuple[float, ...]:
+    """Impulse response of the K-weighting cascade, cut once it has decayed."""
+    sections = k_weighting_coefficients(rate)
+    states = [[0.0, 0.0] for _ in sections]
+    response = []
+    quiet = 0
+    for n in range(1 << 16):
+        value = 1.0 if n == 0 else 0.0
+        for ((b0, b1, b2), (a1, a2)), state in zip(sections, states):
+            out = b0 * value + state[0]
+            state[0] = b1 * value - a1 * out + state[1]
+            state[1] = b2 * value - a2 * out
+            value = out
+        response.append(value)
+        # Stop after a stretch where the tail stays below -120 dB.
+        quiet = quiet + 1 if abs(value) < 1e-6 else 0
+        if quiet >= 256:
+            break
+    return tuple(response[: len(response) - quiet + 1])
+
+
+@lru_cache(maxsize=4)
+def _true_peak_phases() -> tuple[tuple[float, ...], ...]:
+    """Polyphase components of a Hann-windowed sinc interpolator."""
+    length = OVERSAMPLE * _TRUE_PEAK_TAPS_PER_PHASE
+    centre = (length - 1) / 2
+    taps = []
+    for n in range(length):
+        t = (n - centre) / OVERSAMPLE
+        sinc = 1.0 if t == 0 else math.sin(math.pi * t) / (math.pi * t)
+        window = 0.5 - 0.5 * math.cos(2 * math.pi * (n + 0.5) / length)
+        taps.append(sinc * window)
+    phases = [taps[phase::OVERSAMPLE] for phase in range(OVERSAMPLE)]
+    # Unity DC gain per phase so low frequencies aren't over- or under-read.
+    return tuple(tuple(t / sum(phase) for t in phase) for phase in phases)
+
+
+class LoudnessMeter:
+    """Streaming integrated-loudness and peak meter for one PCM stream."""
+
+    def __init__(self, rate: int, channels: int, width: int) -> None:
+        self.rate = rate
+        self.channels = channels
+        self.width = width
+        self._scale = 1.0 / -dsp.sample_limits(width)[0]
+        self._step_frames = max(1, round(rate * STEP_SECONDS))
+        # Summed K-weighted energy of each completed 100 ms step.
+        self._steps: list[float] = []
+        self._partial_energy = 0.0
+        self._partial_frames = 0
+        self._sample_peak = 0.0
+        self._true_peak = 0.0
+        if np is not None:
+            self._response = np.asarray(_k_weighting_response(rate))
+            self._fft_size = 1 << max(12, (4 * len(self._response) - 1).bit_length())
+            self._response_fft = np.fft.rfft(self._response, self._fft_size)
+            self._filter_history = np.zeros((channels, len(self._response) - 1))
+            self._phases = np.asarray(_true_peak_phases())
+            self._peak_history = np.zeros((channels, _TRUE_PEAK_TAPS_PER_PHASE - 1))
+        else:
+            self._sections = k_weighting_coefficients(rate)
+            self._states = [[[0.0, 0.0] for _ in self._sections] for _ in range(channels)]
+
+    def add(self, data: bytes) -> None:
+        if np is not None:
+            self._add_numpy(data)
+        else:
+            self._add_python(data)
+
+    def result(self) -> LoudnessStats:
+        return LoudnessStats(
+            integrated_lufs=self._integrated(),
+            true_peak_dbtp=to_db(max(self._true_peak, self._sample_peak)),
+            sample_peak_dbfs=to_db(self._sample_peak),
+        )
+
+    def _integrated(self) -> float:
+        steps = self._steps
+        if len(steps) < STEPS_PER_BLOCK:
+            # Shorter than one gating block: measure what there is.
+            if not steps and not self._partial_frames:
+                return -math.inf
+            total = sum(steps) + self._partial_energy
+            frames = len(steps) * self._step_frames + self._partial_frames
+            return _lufs(total / frames)
+        # 400 ms blocks overlapping by 75%, as mean squares.
+        block_frames = self._step_frames * STEPS_PER_BLOCK
+        blocks = [
+            sum(steps[i : i + STEPS_PER_BLOCK]) / block_frames
+            for i in range(len(steps) - STEPS_PER_BLOCK + 1)
+        ]
+        audible = [b for b in blocks if _lufs(b) > ABSOLUTE_GATE_LUFS]
+        if not audible:
+            return -math.inf
+        relative_gate = _lufs(sum(audible) / len(audible)) + RELATIVE_GATE_LU
+        gated = [b for b in audible if _lufs(b) > relative_gate]
+        return _lufs(sum(gated) / len(gated))
+
+    def _add_numpy(self, data: bytes) -> None:
+        samples = dsp.NumpyBackend.decode(data, self.width)
+        frames = samples.size // self.channels
+        if not frames:
+            return
+        x = samples[: frames * self.channels].reshape(frames, self.channels).T * self._scale
+        self._sample_peak = max(self._sample_peak, float(np.abs(x).max()))
+        energy = np.zeros(frames)
+        for channel in range(self.channels):
+            filtered, self._filter_history[channel] = self._k_weight(x[channel], self._filter_history[channel])
+            energy += filtered * filtered
+            self._true_peak = max(self._true_peak, self._oversampled_peak(channel, x[channel]))
+        self._bucket(energy)
+
+    def _k_weight(self, x: "np.ndarray", history: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        # Overlap-save: each FFT frame carries len(response) - 1 samples of history.
+        taps = len(self._response)
+        hop = self._fft_size - taps + 1
+        padded = np.concatenate((history, x))
+        out = np.empty(x.size)
+        for start in range(0, x.size, hop):
+            segment = padded[start : start + self._fft_size]
+            count = min(hop, x.size - start)
+            full = np.fft.irfft(np.fft.rfft(segment, self._fft_size) * self._response_fft, self._fft_size)
+            out[start : start + count] = full[taps - 1 : taps - 1 + count]
+        return out, padded[padded.size - (taps - 1) :]
+
+    def _oversampled_peak(self, channel: int, x: "np.ndarray") -> float:
+        padded = np.concatenate((self._peak_history[channel], x))
+        self._peak_history[channel] = padded[padded.size - (_TRUE_PEAK_TAPS_PER_PHASE - 1) :]
+        # Every output phase at once: sliding windows times the reversed phase taps.
+        windows = np.lib.stride_tricks.sliding_window_view(padded, _TRUE_PEAK_TAPS_PER_PHASE)
+        return float(np.abs(windows @ self._phases[:, ::-1].T).max())
+
+    def _bucket(self, energy: "np.ndarray") -> None:
+        step = self._step_frames
+        start = 0
+        if self._partial_frames:
+            take = min(step - self._partial_frames, energy.size)
+            self._partial_energy += float(energy[:take].sum())
+            self._partial_frames += take
+            start = take
+            if self._partial_frames < step:
+                return
+            self._steps.append(self._partial_energy)
+        whole = (energy.size - start) // step
+        if whole:
+            self._steps.extend(energy[start : start + whole * step].reshape(whole, step).sum(axis=1).tolist())
+        rest = energy[start + whole * step :]
+        self._partial_energy = float(rest.sum())
+        self._partial_frames = rest.size
+
+    def _add_python(self, data: bytes) -> None:
+        values = dsp.ArrayBackend.decode(data, self.width)
+        channels = self.channels
+        frames = len(values) // channels
+        scale = self._scale
+        step = self._step_frames
+        peak = self._sample_peak
+        for channel in range(channels):
+            column = values[channel : frames * channels : channels]
+            if column:
+                peak = max(peak, max(column) * scale, -min(column) * scale)
+        self._sample_peak = peak
+        filtered = [self._filter_python(values[c : frames * channels : channels], c) for c in range(channels)]
+        energy = self._partial_energy
+        count = self._partial_frames
+        for frame in range(frames):
+            for column in filtered:
+                energy += column[frame] * column[frame]
+            count += 1
+            if count == step:
+                self._steps.append(energy)
+                energy = 0.0
+                count = 0
+        self._partial_energy = energy
+        self._partial_frames = count
+
+    def _filter_python(self, column: list[int], channel: int) -> list[float]:
+        out = [v * self._scale for v in column]
+        for ((b0, b1, b2), (a1, a2)), state in zip(self._sections, self._states[channel]):
+            z1, z2 = state
+            for i, value in enumerate(out):
+                y = b0 * value + z1
+                z1 = b1 * value - a1 * y + z2
+                z2 = b2 * value - a2 * y
+                out[i] = y
+            state[0], state[1] = z1, z2
+        return out
+
+
+def _lufs(mean_square: float) -> float:
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else -math.inf
+
+
+def analyze_wav(path: Path, block_frames: int = 1 << 16) -> LoudnessStats:
+    """Measure ``path`` in a single streaming pass over its data chunk."""
+    layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    meter = LoudnessMeter(layout.rate, layout.channels, layout.sampwidth)
+    block_bytes = block_frames * layout.block_align
+    remaining = layout.data_size - layout.data_size % layout.block_align
+    with open(path, "rb") as handle:
+        handle.seek(layout.data_offset)
+        while remaining > 0:
+            chunk = handle.read(min(block_bytes, remaining))
+            if not chunk:
+                break
+            meter.add(chunk)
+            remaining -= len(chunk)
+    return meter.result()
+
+
+def normalization_gain(stats: LoudnessStats, mode: str, target_lufs: float, ceiling_db: float) -> float:
+    """Linear gain for ``mode`` ("peak" or "loudness"), never past ``ceiling_db``.
+
+    Returns 1.0 when there is nothing to measure (silence).
+    """
+    headroom_db = ceiling_db - stats.true_peak_dbtp
+    if mode == "peak":
+        gain_db = headroom_db
+    else:
+        gain_db = min(target_lufs - stats.integrated_lufs, headroom_db)
+    if not math.isfinite(gain_db):
+        return 1.0
+    return 10 ** (min(gain_db, MAX_NORMALIZE_GAIN_DB) / 20)
@@ -0,0 +1,63 @@
+"""Compressed formats QMediaRecorder can write directly.
+
+Which containers and codecs can be encoded depends on the Qt multimedia
+backend (FFmpeg, GStreamer, Windows Media Foundation, AVFoundation) and how
+it was built, so ``supported`` asks the backend once and caches the answer
+for the session.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+from PyQt6.QtMultimedia import QMediaFormat
+
+
+@dataclass(frozen=True)
+class NativeFormat:
+    name: str
+    file_format: QMediaFormat.FileFormat
+    codec: QMediaFormat.AudioCodec
+    # Extension for the output file; Anki plays all of these.
+    suffix: str
+
+
+# Keyed by the names used in the output_format setting.
+NATIVE_FORMATS = {
+    "opus": NativeFormat("opus", QMediaFormat.FileFormat.Ogg, QMediaFormat.AudioCodec.Opus, ".opus"),
+    "vorbis": NativeFormat("vorbis", QMediaFormat.FileFormat.Ogg, QMediaFormat.AudioCodec.Vorbis, ".ogg"),
+    "mp3": NativeFormat("mp3", QMediaFormat.FileFormat.MP3, QMediaFormat.AudioCodec.MP3, ".mp3"),
+    "aac": NativeFormat("aac", QMediaFormat.FileFormat.Mpeg4Audio, QMediaFormat.AudioCodec.AAC, ".m4a"),
+}
+
+
+@lru_cache(maxsize=None)
+def supported() -> frozenset[str]:
+    """Names in ``NATIVE_FORMATS`` the backend can encode, probed on first call."""
+    encode = QMediaFormat.ConversionMode.Encode
+    file_formats = set(QMediaFormat().supportedFileFormats(encode))
+    names = set()
+    for native in NATIVE_FORMATS.values():
+        if native.file_format not in file_formats:
+            continue
+        # The codec list is narrowed down to what the container set here can hold.
+        if native.codec in QMediaFormat(native.file_format).supportedAudioCodecs(encode):
+            names.add(native.name)
+    print(f"AnkiVoiceRecorder native formats: {', '.join(sorted(names)) or 'none'}")
+    return frozenset(names)
+
+
+def media_format(name: str) -> QMediaFormat:
+    """The ``QMediaFormat`` for an output name; anything not native is WAV."""
+    native = NATIVE_FORMATS.get(name)
+    if native is None:
+        return QMediaFormat(QMediaFormat.FileFormat.Wave)
+    fmt = QMediaFormat(native.file_format)
+    fmt.setAudioCodec(native.codec)
+    return fmt
+
+
+def suffix(name: str) -> str:
+    native = NATIVE_FORMATS.get(name)
+    return native.suffix if native is not None else ".wav"
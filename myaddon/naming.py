@@ -0,0 +1,132 @@
+"""File names for new takes, built from a template and unique without disk probes.
+
+Templates use ``str.format`` fields:
+
+- ``{date}``, ``{time}``: YYYYMMDD and HHMMSS when the take starts.
+- ``{seq}``: a counter, e.g. ``{seq:04d}``.
+- ``{deck}``, ``{note}``, ``{card}``, ``{field}``: the card under review (deck
+  name, note ID, card ID and the note's sort field), or empty.
+
+Uniqueness comes from ``{seq}``, which every template contains (one is
+appended otherwise). ``Namer`` lists the directory once, finds the highest
+counter among names the template could have produced and counts up from
+there in memory, so naming a take never touches the disk again, however
+large the media folder is.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import os
+from pathlib import Path
+import re
+import string
+
+DEFAULT_TEMPLATE = "voice_{date}_{time}_{seq:04d}"
+FIELDS = ("date", "time", "seq", "deck", "note", "card", "field")
+# Longest piece of deck name or field text put into a file name.
+MAX_TEXT_LENGTH = 40
+
+
+@dataclass(frozen=True)
+class TakeContext:
+    """What the take belongs to; empty outside the reviewer."""
+
+    deck: str = ""
+    deck_id: int = 0
+    note: int = 0
+    card: int = 0
+    field: str = ""
+
+
+def check_template(template: str) -> str:
+    """``template`` with ``_{seq}`` appended if it has no counter.
+
+    Raises ``ValueError`` for unknown fields, bad format specs or names that
+    would leave the directory.
+    """
+    template = template.strip()
+    if not template or "/" in template or "\\" in template:
+        raise ValueError("template must be a plain file name")
+    names = [name for _, name, _, _ in string.Formatter().parse(template) if name is not None]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"unknown template field {unknown[0]!r}")
+    if "seq" not in names:
+        template += "_{seq}"
+    # Render with and without a card so bad format specs surface here.
+    for context in (TakeContext(), TakeContext(deck="d", note=1, card=1, field="f")):
+        try:
+            _render(template, datetime(2000, 1, 1), 1, context)
+        except (TypeError, KeyError, IndexError) as exc:
+            raise ValueError(f"bad template: {exc}") from None
+    return template
+
+
+class Namer:
+    """Hands out paths for one template, keeping a ``{seq}`` counter per directory."""
+
+    def __init__(self, template: str) -> None:
+        self.template = check_template(template)
+        self._pattern = _stem_pattern(self.template)
+        self._next: dict[Path, int] = {}
+        fields = {name for _, name, _, _ in string.Formatter().parse(self.template)}
+        # Only then is it worth looking up the card under review.
+        self.needs_context = not fields.isdisjoint({"deck", "note", "card", "field"})
+
+    def matches(self, name: str) -> bool:
+        """True if the template could have produced the file name ``name``."""
+        return self._pattern.match(name) is not None
+
+    def next_path(self, directory: Path, suffix: str, context: TakeContext | None = None) -> Path:
+        seq = self._next.get(directory)
+        if seq is None:
+            seq = self._seed(directory)
+        self._next[directory] = seq + 1
+        return directory / (_render(self.template, datetime.now(), seq, context or TakeContext()) + suffix)
+
+    def _seed(self, directory: Path) -> int:
+        # One listing per directory and session; everything after is in memory.
+        highest = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    match = self._pattern.match(entry.name)
+                    if match:
+                        highest = max(highest, int(match.group("seq")))
+        except OSError:
+            pass
+        return highest + 1
+
+
+def _render(template: str, when: datetime, seq: int, context: TakeContext) -> str:
+    return template.format(
+        date=when.strftime("%Y%m%d"),
+        time=when.strftime("%H%M%S"),
+        seq=seq,
+        deck=_clean(context.deck),
+        note=context.note or "",
+        card=context.card or "",
+        field=_clean(context.field),
+    )
+
+
+def _clean(text: str) -> str:
+    # Letters, digits, "-" and "_" only, so names stay safe on every platform.
+    return re.sub(r"[^\w-]+", "_", text).strip("_")[:MAX_TEXT_LENGTH]
+
+
+def _stem_pattern(template: str) -> re.Pattern[str]:
+    """Regex matching file names (any extension) the template could produce."""
+    parts = []
+    seen_seq = False
+    for literal, name, _, _ in string.Formatter().parse(template):
+        parts.append(re.escape(literal))
+        if name == "seq":
+            parts.append(r"(?P=seq)" if seen_seq else r"(?P<seq>\d+)")
+            seen_seq = True
+        elif name is not None:
+            parts.append(r"[\w-]*?")
+    # Extensions, including temporary ones such as ".flac.part".
+    return re.compile("".join(parts) + r"(?:\.[^.]+)*$")
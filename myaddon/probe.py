@@ -0,0 +1,179 @@
+"""Duration and format of recordings from their headers alone.
+
+``probe`` reads the first few KiB of a file: the RIFF chunk headers of a
+WAV or the STREAMINFO block of a FLAC. Only when a WAV's chunk sizes don't
+add up (a recorder killed mid-take, a broken editor) is the whole file
+searched for its ``fmt `` and ``data`` chunks.
+
+``Prober`` runs probes across a thread pool and caches each result under
+the file's (mtime, size), so a second scan of an unchanged folder is one
+``stat`` per file. The cache can be kept in a file between sessions.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Iterable
+
+from . import flac
+from .wavproc import parse_fmt
+
+# Enough for the RIFF, fmt and data headers of anything a recorder writes,
+# including a LIST/INFO chunk or two in between.
+HEAD_SIZE = 4096
+SUFFIXES = (".wav", ".flac")
+
+
+@dataclass(frozen=True)
+class AudioInfo:
+    # Seconds.
+    duration: float
+    rate: int
+    channels: int
+    bits: int
+
+
+def probe(path: Path) -> AudioInfo:
+    """Format and length of a WAV or FLAC file, reading as little as possible.
+
+    Raises ``ValueError`` if it is neither, or too broken to tell.
+    """
+    if path.suffix.lower() == ".flac":
+        info = flac.read_info(path)
+        duration = info.total_samples / info.rate if info.rate else 0.0
+        return AudioInfo(duration, info.rate, info.channels, info.bits_per_sample)
+    with open(path, "rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        head = handle.read(HEAD_SIZE)
+        try:
+            fmt, data_size = _walk_chunks(head, size)
+        except ValueError:
+            # Bad chunk sizes: look for the chunks themselves.
+            fmt, data_size = _search_chunks(handle, size)
+    _, channels, rate, bits = fmt
+    frames = data_size // (channels * ((bits + 7) // 8))
+    return AudioInfo(frames / rate if rate else 0.0, rate, channels, bits)
+
+
+def _walk_chunks(head: bytes, file_size: int) -> tuple[tuple[int, int, int, int], int]:
+    # Like wavproc.read_layout, but over bytes already read.
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    offset = 12
+    while offset + 8 <= min(len(head), file_size):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", head, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if body + 16 > len(head):
+                raise ValueError("fmt chunk past the header")
+            fmt = parse_fmt(head[body : body + min(chunk_size, 40)])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            available = file_size - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            return fmt, chunk_size
+        elif not all(0x20 <= byte < 0x7F for byte in chunk_id):
+            # Any printable FourCC is valid (e.g. "_PMX"); anything else means
+            # the walk went off the rails.
+            raise ValueError("garbled chunk header")
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("no data chunk in the header")
+
+
+def _search_chunks(handle, file_size: int) -> tuple[tuple[int, int, int, int], int]:
+    if file_size < 12:
+        raise ValueError("not a RIFF/WAVE file")
+    with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        if view[:4] != b"RIFF" or view[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+        found = view.find(b"fmt ", 12)
+        if found < 0 or found + 24 > file_size:
+            raise ValueError("no fmt chunk")
+        (fmt_size,) = struct.unpack_from("<I", view, found + 4)
+        fmt = parse_fmt(view[found + 8 : found + 8 + min(fmt_size, 40)])
+        found = view.find(b"data", found + 8)
+        if found < 0:
+            raise ValueError("no data chunk")
+    # A size from a broken header can't be trusted; everything after it is audio.
+    return fmt, max(0, file_size - found - 8)
+
+
+class Prober:
+    """Probes many files in parallel, remembering results per (mtime, size)."""
+
+    def __init__(self, cache_file: Path | None = None, workers: int | None = None) -> None:
+        self.cache_file = cache_file
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self._cache: dict[str, tuple[int, int, AudioInfo]] = {}
+        self._dirty = False
+        if cache_file is not None:
+            self._load()
+
+    def probe(self, path: Path) -> AudioInfo | None:
+        """``AudioInfo`` for ``path``, or None if it is missing or unreadable."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        cached = self._cache.get(key)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        try:
+            info = probe(path)
+        except (OSError, ValueError):
+            return None
+        # One dict assignment, so worker threads can share the cache.
+        self._cache[key] = (stat.st_mtime_ns, stat.st_size, info)
+        self._dirty = True
+        return info
+
+    def probe_many(self, paths: Iterable[Path]) -> dict[Path, AudioInfo]:
+        """Results for every readable file in ``paths``."""
+        paths = list(paths)
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = pool.map(self.probe, paths, chunksize=64)
+            return {path: info for path, info in zip(paths, results) if info is not None}
+
+    def scan(self, directory: Path, suffixes: tuple[str, ...] = SUFFIXES) -> dict[Path, AudioInfo]:
+        """Probe every recording directly inside ``directory``."""
+        with os.scandir(directory) as entries:
+            paths = [Path(entry.path) for entry in entries if entry.name.lower().endswith(suffixes)]
+        return self.probe_many(paths)
+
+    def save(self) -> None:
+        """Write the cache back if anything changed, dropping files that are gone."""
+        if self.cache_file is None or not self._dirty:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.cache_file.with_name(self.cache_file.name + ".part")
+        with open(partial, "w", encoding="utf-8") as handle:
+            for key, (mtime, size, info) in self._cache.items():
+                if os.path.exists(key):
+                    handle.write(
+                        f"{mtime}\t{size}\t{info.duration!r}\t{info.rate}\t{info.channels}\t{info.bits}\t{key}\n"
+                    )
+        partial.replace(self.cache_file)
+        self._dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, encoding="utf-8") as handle:
+                for line in handle:
+                    fields = line.rstrip("\n").split("\t", 6)
+                    if len(fields) != 7:
+                        continue
+                    mtime, size, duration, rate, channels, bits, key = fields
+                    info = AudioInfo(float(duration), int(rate), int(channels), int(bits))
+                    self._cache[key] = (int(mtime), int(size), info)
+        except (OSError, ValueError):
+            # A damaged cache only costs a rescan.
+            self._cache.clear()
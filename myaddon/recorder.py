@@ -0,0 +1,824 @@
+"""The recording engine: capture session, finalization and post-processing.
+
+Importing this module pulls in ``PyQt6.QtMultimedia``, so the add-on only
+imports it on the first record or play action.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+import dataclasses
+import enum
+from functools import partial
+import math
+import os
+from pathlib import Path
+import re
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+
+from anki.utils import strip_html
+from aqt import mw
+from aqt.operations import CollectionOp
+from aqt.qt import QTimer, QUrl
+from aqt.utils import askUser, showWarning, tooltip
+from PyQt6.QtMultimedia import (
+    QAudioInput,
+    QAudioOutput,
+    QMediaCaptureSession,
+    QMediaPlayer,
+    QMediaRecorder,
+)
+
+from . import (
+    config,
+    dedup,
+    downmix,
+    flac,
+    history,
+    library,
+    loudness,
+    mediaformats,
+    naming,
+    probe,
+    stages,
+    vad,
+    wavproc,
+)
+from .capture import PcmCaptureEngine
+from .devices import DeviceManager, device_id
+from .worker import PostProcessor
+
+if TYPE_CHECKING:
+    from anki.collection import Collection, OpChanges
+
+# How long to wait for the backend to report the file closed before giving up.
+FINALIZE_TIMEOUT_MS = 10000
+# Anki keeps an add-on's user_files folder across updates.
+USER_FILES = Path(__file__).parent / "user_files"
+# Kept next to the collection: takes and their note/card IDs belong to one profile.
+RECORDINGS_DB = "voice_recordings.sqlite3"
+SOUND_TAG = re.compile(r"\[sound:([^\]]+)\]")
+
+
+class _State(enum.Enum):
+    IDLE = "idle"
+    RECORDING = "recording"
+    # stop() was called; waiting for QMediaRecorder to close the file.
+    FINALIZING = "finalizing"
+
+
+class VoiceRecorder:
+    def __init__(self) -> None:
+        # Wire up the capture session, recorder, and playback pipeline. The
+        # input device is bound later by _rebind(), once devices are known.
+        self._capture = QMediaCaptureSession()
+        self._audio_input: QAudioInput | None = None
+        # Alternative engine that processes raw PCM while recording.
+        self._pcm: PcmCaptureEngine | None = None
+        self._device_id: str | None = None
+        self._rebind_pending = False
+        self._recorder = QMediaRecorder()
+        self._capture.setRecorder(self._recorder)
+        # QMediaRecorder.stop() is asynchronous: the file is only complete once
+        # the recorder reports StoppedState, so finalization is signal-driven.
+        self._recorder.recorderStateChanged.connect(self._on_recorder_state_changed)
+        self._recorder.actualLocationChanged.connect(self._on_actual_location_changed)
+        self._recorder.errorOccurred.connect(self._on_recorder_error)
+        self._recorder.durationChanged.connect(self._on_duration_changed)
+        self._finalize_timer = QTimer()
+        self._finalize_timer.setSingleShot(True)
+        self._finalize_timer.timeout.connect(self._on_finalize_timeout)
+        # Playback uses a simple media player -> audio output chain.
+        self._audio_output = QAudioOutput()
+        self._player = QMediaPlayer()
+        self._player.setAudioOutput(self._audio_output)
+        # Gain and friends run on a worker thread; results come back as signals.
+        self._post = PostProcessor()
+        self._post.finished.connect(self._on_post_finished)
+        self._post.failed.connect(self._on_post_failed)
+        # Only touched by post-processing jobs, which run one at a time.
+        self._hash_index = dedup.HashIndex(USER_FILES / "content_index.tsv")
+        # Every finished take gets a row, written by its post-processing job.
+        self.recordings: library.RecordingLibrary | None = None
+        # Recent takes, filled from the index when a profile is loaded.
+        self._history: history.History | None = None
+        self._state = _State.IDLE
+        self._last_path: Path | None = None
+        # perf_counter() stamps: stop request of the current take, and
+        # (stop requested, file ready) for takes queued for post-processing.
+        self._stop_requested_at = 0.0
+        self._ready_stamps: dict[Path, tuple[float, float]] = {}
+        # Hotkey press and first captured sample of the current take.
+        self._hotkey_at = 0.0
+        self._first_sample_at: float | None = None
+        self.last_timings: dict[str, float] = {}
+        self._take_settings: config.Settings | None = None
+        # True when the take's samples already went through the live chain.
+        self._take_live = False
+        # Output format chosen for the take from the output_format preferences.
+        self._take_output = "wav"
+        # When the take started and the card it was recorded for.
+        self._take_info: library.TakeInfo | None = None
+        # Warm mode: media format set once and the input device kept open.
+        self._warm = False
+        # Output the recorder's media format was last set up for.
+        self._configured_output: str | None = None
+        # Hands out file names; rebuilt when the template setting changes.
+        self._namer: naming.Namer | None = None
+        # Inputs are enumerated once, cached and followed across hot-plugs.
+        self._devices = DeviceManager()
+        self._devices.changed.connect(self._on_devices_changed)
+        self.load_profile()
+
+    def load_profile(self) -> None:
+        """Switch the recording index and history to the open profile.
+
+        Runs before any take of the profile is queued, so the history is
+        filled from the index exactly once and new takes are only pushed.
+        """
+        self.recordings = library.RecordingLibrary(Path(mw.pm.profileFolder()) / RECORDINGS_DB)
+        size = config.settings().history_size
+        try:
+            recent = [recording.path for recording in self.recordings.recent(size)]
+        except sqlite3.Error as exc:
+            print(f"AnkiVoiceRecorder could not read the recording index: {exc}")
+            recent = []
+        self._history = history.History(size, recent)
+        self._last_path = None
+
+    def index_existing(self) -> None:
+        """Add recordings in the save folder that predate the index, off the GUI thread."""
+        directory = config.get_save_dir()
+        namer = naming.Namer(config.settings().filename_template)
+        recordings = self.recordings
+
+        def scan() -> tuple[int, int]:
+            # Only names this add-on could have given, not every sound in the media folder.
+            with os.scandir(directory) as entries:
+                paths = [
+                    Path(entry.path)
+                    for entry in entries
+                    if entry.name.lower().endswith(probe.SUFFIXES)
+                    and (namer.matches(entry.name) or entry.name.startswith(dedup.NAME_PREFIX))
+                ]
+            prober = probe.Prober(USER_FILES / "probe_cache.tsv")
+            found = prober.probe_many(paths)
+            prober.save()
+            return len(found), recordings.add_existing(found)
+
+        def done(future: Future) -> None:
+            try:
+                found, added = future.result()
+            except (OSError, sqlite3.Error) as exc:
+                showWarning(f"Could not index recordings: {exc}")
+                return
+            print(f"AnkiVoiceRecorder indexed {added} of {found} recordings in {directory}")
+            tooltip(f"Indexed {added} earlier recordings ({found} found).", parent=mw, period=3000)
+
+        tooltip("Indexing existing recordings...", parent=mw, period=1500)
+        mw.taskman.run_in_background(scan, done)
+
+    def merge_duplicates(self) -> None:
+        """Find recordings in the save folder with the same audio and offer to keep one of each."""
+        directory = config.get_save_dir()
+        suffixes = probe.SUFFIXES + tuple(native.suffix for native in mediaformats.NATIVE_FORMATS.values())
+
+        def scan() -> tuple[dict[Path, Path], int]:
+            with os.scandir(directory) as entries:
+                paths = [Path(entry.path) for entry in entries if entry.name.lower().endswith(suffixes)]
+            prober = probe.Prober(USER_FILES / "probe_cache.tsv")
+            found = prober.probe_many(path for path in paths if path.suffix.lower() in probe.SUFFIXES)
+            prober.save()
+            # Copies of the same audio share format and length; files that
+            # can't be probed can only be byte-for-byte copies, so size will do.
+            shapes: dict[Path, object] = {}
+            for path in paths:
+                try:
+                    shapes[path] = found.get(path) or path.stat().st_size
+                except OSError:
+                    continue
+            copies = {copy: kept for kept, *rest in dedup.find_duplicates(shapes).values() for copy in rest}
+            return copies, sum(copy.stat().st_size for copy in copies)
+
+        def done(future: Future) -> None:
+            try:
+                copies, size = future.result()
+            except OSError as exc:
+                showWarning(f"Could not look for duplicate recordings: {exc}")
+                return
+            if not copies:
+                tooltip("No duplicate recordings found.", parent=mw, period=2000)
+                return
+            question = (
+                f"{len(copies)} recordings in {directory} are copies of another one "
+                f"({size / 1e6:.1f} MB). Point the notes that play them at the file kept "
+                "and remove the copies?"
+            )
+            if askUser(question, parent=mw):
+                self._merge_copies(directory, copies)
+
+        tooltip("Looking for duplicate recordings...", parent=mw, period=1500)
+        mw.taskman.run_in_background(scan, done)
+
+    def _merge_copies(self, directory: Path, copies: dict[Path, Path]) -> None:
+        recordings = self.recordings
+        in_media = directory == Path(mw.col.media.dir())
+        names = {copy.name: kept.name for copy, kept in copies.items()}
+        # Notes changed, reported back from the collection thread.
+        updated: list[int] = []
+
+        def swap(match: re.Match) -> str:
+            return f"[sound:{names.get(match.group(1), match.group(1))}]"
+
+        def merge(col: Collection) -> OpChanges:
+            notes = []
+            for note_id, fields in col.db.execute("SELECT id, flds FROM notes WHERE flds LIKE '%[sound:%'"):
+                if any(name in names for name in SOUND_TAG.findall(fields)):
+                    note = col.get_note(note_id)
+                    note.fields = [SOUND_TAG.sub(swap, value) for value in note.fields]
+                    notes.append(note)
+            # Notes first, so nothing is left pointing at a removed file.
+            changes = col.update_notes(notes)
+            updated.append(len(notes))
+            if in_media:
+                # Recoverable from Check Media's trash, like Anki's own deletions.
+                col.media.trash_files(list(names))
+            else:
+                for copy in copies:
+                    copy.unlink(missing_ok=True)
+            for copy, kept in copies.items():
+                recordings.move(copy, kept)
+            return changes
+
+        def success(_changes: OpChanges) -> None:
+            print(f"AnkiVoiceRecorder merged {len(copies)} duplicate recordings in {directory}")
+            tooltip(f"Removed {len(copies)} duplicate recordings, updated {updated[0]} notes.", parent=mw, period=3000)
+
+        CollectionOp(parent=mw, op=merge).success(success).run_in_background()
+
+    def toggle(self) -> None:
+        if self._state is _State.RECORDING:
+            self.stop()
+        elif self._state is _State.FINALIZING:
+            tooltip("Still saving the previous recording...", parent=mw, period=1500)
+        else:
+            self.start()
+
+    def start(self) -> None:
+        self._hotkey_at = time.perf_counter()
+        self._first_sample_at = None
+        self.last_timings = {}
+        if mw.col is None:
+            showWarning("No collection is open.")
+            return
+        # Everything about this take, including post-processing, uses the
+        # settings in force when it started.
+        self._take_settings = config.settings()
+        self._take_live = False
+        if self._audio_input is None:
+            # Nothing bound yet (or nothing plugged in last time we looked).
+            self._rebind()
+        if self._audio_input is None:
+            showWarning("No audio input device available.")
+            return
+
+        use_pcm = config.settings().capture_engine == "pcm" and self._pcm is not None
+        self._take_output = _choose_output(self._take_settings, native=not use_pcm)
+
+        namer = self._get_namer()
+        context = _take_context(names=namer.needs_context)
+        self._take_info = library.TakeInfo(
+            created=time.time(), note_id=context.note, card_id=context.card, deck_id=context.deck_id
+        )
+        # A unique name in the configured media folder, without probing the disk.
+        path = namer.next_path(config.get_save_dir(), mediaformats.suffix(self._take_output), context)
+
+        if use_pcm:
+            self._start_pcm(path)
+            self._start_auto_stop()
+            return
+
+        # Configure the output format and start recording to disk. A warm
+        # pipeline keeps the format from the previous take and only moves the output.
+        if not (self._warm and self._configured_output == self._take_output):
+            self._configure_media_format(self._take_output)
+        self._recorder.setOutputLocation(QUrl.fromLocalFile(str(path)))
+        # Set state first: some backends report errors synchronously from record().
+        self._state = _State.RECORDING
+        self._last_path = path
+        self._recorder.record()
+        record_shortcut = config.settings().record_shortcut
+        tooltip(f"Recording started ({record_shortcut} to stop)", parent=mw, period=2000)
+        self._start_auto_stop()
+
+    def _get_namer(self) -> naming.Namer:
+        template = self._take_settings.filename_template
+        if self._namer is None or self._namer.template != template:
+            self._namer = naming.Namer(template)
+        return self._namer
+
+    def _start_auto_stop(self) -> None:
+        settings = self._take_settings
+        if not settings.auto_stop or self._state is not _State.RECORDING or self._pcm is None:
+            return
+        if not self._pcm.active and not self._pcm.armed:
+            # QMediaRecorder exposes no levels, so meter the same input on
+            # the side; _set_idle closes it again.
+            try:
+                self._pcm.arm()
+            except RuntimeError as exc:
+                print(f"AnkiVoiceRecorder auto-stop unavailable: {exc}")
+                return
+        width, channels, rate = self._pcm.frame_format
+        detector = vad.SilenceDetector(width, channels, rate, settings.auto_stop_silence_ms / 1000)
+        if self._pcm.active:
+            # The take's pre-roll went straight to the file; let the detector
+            # hear it first so speech already under way counts.
+            detector.feed_all(self._pcm.lead_in)
+        self._pcm.monitor = partial(self._on_monitored_buffer, detector)
+
+    def _on_monitored_buffer(self, detector: vad.SilenceDetector, data: bytes) -> None:
+        if detector.feed(data) and self._state is _State.RECORDING:
+            self._pcm.monitor = None
+            # Not from inside the engine's read handler: stop() drains it too.
+            QTimer.singleShot(0, self._auto_stop)
+
+    def _auto_stop(self) -> None:
+        if self._state is _State.RECORDING:
+            print("AnkiVoiceRecorder: silence detected, stopping")
+            self.stop()
+
+    def _configure_media_format(self, output: str) -> None:
+        # WAV for "wav" and "flac" (encoded after the post pass), otherwise
+        # the backend compresses while recording.
+        self._recorder.setMediaFormat(mediaformats.media_format(output))
+        settings = config.settings()
+        if output in mediaformats.NATIVE_FORMATS and settings.bitrate_kbps:
+            self._recorder.setEncodingMode(QMediaRecorder.EncodingMode.AverageBitRateEncoding)
+            self._recorder.setAudioBitRate(settings.bitrate_kbps * 1000)
+        else:
+            self._recorder.setEncodingMode(QMediaRecorder.EncodingMode.ConstantQualityEncoding)
+        # Hints only (-1 = backend default); the post pass converts whatever
+        # still comes out different. QMediaRecorder has no sample-format knob.
+        self._recorder.setAudioSampleRate(settings.sample_rate or -1)
+        self._recorder.setAudioChannelCount(settings.channels or -1)
+        self._configured_output = output
+
+    def _on_duration_changed(self, duration: int) -> None:
+        # The first non-zero duration is the earliest sign samples are arriving.
+        if duration > 0 and self._first_sample_at is None and self._state is _State.RECORDING:
+            self._first_sample_at = time.perf_counter()
+            self._record_start_latency()
+
+    def _record_start_latency(self) -> None:
+        latency_ms = (self._first_sample_at - self._hotkey_at) * 1000
+        self.last_timings["hotkey_to_first_sample_ms"] = latency_ms
+        mode = "warm" if self._warm or (self._pcm is not None and self._pcm.armed) else "cold"
+        print(f"AnkiVoiceRecorder start latency ({mode}): {latency_ms:.0f} ms")
+
+    def _start_pcm(self, path: Path) -> None:
+        # Gain and DC removal happen per chunk; only whole-file stages such as
+        # normalization still need a pass after stop.
+        settings = self._take_settings
+        gain = 1.0 if settings.normalize != "off" else settings.gain
+        make_chain = partial(_live_chain, settings=settings, gain=gain)
+        try:
+            self._pcm.start(path, make_chain)
+        except (OSError, RuntimeError) as exc:
+            showWarning(f"Could not start recording: {exc}")
+            return
+        self._take_live = True
+        self._state = _State.RECORDING
+        self._last_path = path
+        record_shortcut = config.settings().record_shortcut
+        tooltip(f"Recording started ({record_shortcut} to stop)", parent=mw, period=2000)
+
+    def stop(self) -> None:
+        if self._state is not _State.RECORDING:
+            return
+        if self._pcm is not None:
+            self._pcm.monitor = None
+        if self._pcm is not None and self._pcm.active:
+            self._stop_requested_at = time.perf_counter()
+            path = self._pcm.stop()
+            if self._pcm.first_sample_at is not None:
+                self._first_sample_at = self._pcm.first_sample_at
+                self._record_start_latency()
+            self._set_idle()
+            self._queue_post_processing(path)
+            return
+        self._state = _State.FINALIZING
+        self._stop_requested_at = time.perf_counter()
+        self._finalize_timer.start(FINALIZE_TIMEOUT_MS)
+        self._recorder.stop()
+        # Post-processing is scheduled from _on_recorder_state_changed once the
+        # backend has actually closed the file.
+
+    def _on_recorder_state_changed(self, state: QMediaRecorder.RecorderState) -> None:
+        if state == QMediaRecorder.RecorderState.StoppedState and self._state is _State.FINALIZING:
+            self._finish_take()
+
+    def _on_actual_location_changed(self, url: QUrl) -> None:
+        # Backends may adjust the requested name (e.g. add an extension).
+        local = url.toLocalFile()
+        if local and self._state is not _State.IDLE:
+            self._last_path = Path(local)
+
+    def _on_recorder_error(self, error: QMediaRecorder.Error, message: str) -> None:
+        print(f"AnkiVoiceRecorder recorder error ({error}): {message}")
+        if self._state is _State.RECORDING:
+            # The backend stops on errors; keep whatever made it to disk.
+            self._state = _State.FINALIZING
+            self._stop_requested_at = time.perf_counter()
+            self._finalize_timer.start(FINALIZE_TIMEOUT_MS)
+        if self._recorder.recorderState() == QMediaRecorder.RecorderState.StoppedState:
+            self._on_recorder_state_changed(QMediaRecorder.RecorderState.StoppedState)
+
+    def _on_finalize_timeout(self) -> None:
+        if self._state is _State.FINALIZING:
+            print("AnkiVoiceRecorder: recorder never reported stopped; finalizing anyway")
+            self._finish_take()
+
+    def _finish_take(self) -> None:
+        self._finalize_timer.stop()
+        self._set_idle()
+        path = self._last_path
+        if path is None or not path.exists():
+            tooltip("Recording stopped.", parent=mw, period=2000)
+            return
+        self._queue_post_processing(path)
+
+    def _queue_post_processing(self, path: Path) -> None:
+        self._ready_stamps[path] = (self._stop_requested_at, time.perf_counter())
+        settings = self._take_settings or config.settings()
+        output = self._take_output
+        if output in mediaformats.NATIVE_FORMATS:
+            # Compressed by the backend while recording; the sample passes need PCM.
+            if settings.trim_silence or settings.normalize != "off" or settings.gain != 1.0 or settings.compressor:
+                print(
+                    f"AnkiVoiceRecorder: {path.name} was recorded as {output}; "
+                    "trimming, gain and normalization only apply to WAV and FLAC output"
+                )
+        take = self._take_info or library.TakeInfo(created=time.time())
+        if output in mediaformats.NATIVE_FORMATS:
+            # Not measured on the worker; the recorder's clock is the only length there is.
+            take = dataclasses.replace(take, duration=self._recorder.duration() / 1000)
+        # Every take goes through the worker, if only to be indexed. The job
+        # only sees the immutable settings snapshot, never mw or config.
+        index = self._hash_index if settings.content_naming else None
+        job = partial(
+            _post_process,
+            settings=settings,
+            live=self._take_live,
+            output=output,
+            index=index,
+            recordings=self.recordings,
+            take=take,
+        )
+        self._post.submit(path, job)
+
+    def _on_post_finished(self, path: Path, final: Path | None = None) -> None:
+        done = time.perf_counter()
+        stopped, ready = self._ready_stamps.pop(path, (done, done))
+        self.last_timings.update(
+            stop_to_file_ready_ms=(ready - stopped) * 1000,
+            post_process_ms=(done - ready) * 1000,
+            stop_to_final_ms=(done - stopped) * 1000,
+        )
+        # The take may have been re-encoded under a new name.
+        final = final or path
+        if self._last_path == path:
+            self._last_path = final
+        self._history_ring().push(final)
+        timings = ", ".join(f"{k}={v:.0f}" for k, v in self.last_timings.items())
+        print(f"AnkiVoiceRecorder saved: {final} ({timings})")
+        tooltip(f"Recording saved: {final.name}", parent=mw, period=2000)
+
+    def _on_post_failed(self, path: Path, error: str) -> None:
+        self._ready_stamps.pop(path, None)
+        # The take is still on disk, just without post-processing applied.
+        print(f"AnkiVoiceRecorder post-processing failed for {path}: {error}")
+        if path.exists():
+            self._history_ring().push(path)
+        tooltip(f"Recording saved without processing: {path.name}", parent=mw, period=3000)
+
+    def wait_for_post_processing(self) -> None:
+        self._post.wait()
+
+    def _set_idle(self) -> None:
+        self._state = _State.IDLE
+        if self._rebind_pending:
+            self._rebind_pending = False
+            self._rebind()
+        elif self._take_settings is not None and self._take_settings.auto_stop:
+            # Close the input again if it was only open for auto-stop metering.
+            self._apply_arming()
+
+    def _on_devices_changed(self) -> None:
+        # Never swap the input under a take; pick the change up once idle.
+        if self._state is _State.IDLE:
+            self._rebind()
+        else:
+            self._rebind_pending = True
+
+    def _rebind(self) -> None:
+        """Point the capture session at the pinned or default input."""
+        device = self._devices.select(config.settings().input_device_id)
+        new_id = device_id(device) if device is not None else None
+        if new_id == self._device_id and (device is None) == (self._audio_input is None):
+            return
+        if self._pcm is not None:
+            self._pcm.disarm()
+        self._device_id = new_id
+        if device is None:
+            self._audio_input = None
+            self._pcm = None
+            self._capture.setAudioInput(None)
+            print("AnkiVoiceRecorder: no audio input devices found")
+            return
+        self._audio_input = QAudioInput(device)
+        self._capture.setAudioInput(self._audio_input)
+        self._pcm = PcmCaptureEngine(device)
+        print(f"AnkiVoiceRecorder input: {device.description()} (id {new_id})")
+        self._request_pcm_format()
+        self._apply_arming()
+
+    def _request_pcm_format(self) -> None:
+        settings = config.settings()
+        self._pcm.request_format(settings.bit_depth // 8, settings.channels, settings.sample_rate)
+
+    def apply_capture_settings(self) -> None:
+        self._warm = config.settings().warm_pipeline
+        if self._warm and self._state is _State.IDLE:
+            self._configure_media_format(_choose_output(config.settings(), native=True))
+        # The pinned device may have changed. Only rebind once inputs are known,
+        # so a config change doesn't trigger the first enumeration early.
+        if self._state is _State.IDLE and self._devices.ready:
+            self._rebind()
+        if self._pcm is not None and not self._pcm.active:
+            self._request_pcm_format()
+        self._apply_arming()
+
+    def _apply_arming(self) -> None:
+        # Armed mode keeps the input device open between takes, either to fill
+        # the pre-roll (pcm engine) or to stop the audio server from suspending
+        # the source so the next take starts warm.
+        if self._pcm is None or self._pcm.active:
+            return
+        settings = config.settings()
+        preroll = settings.preroll_seconds if settings.capture_engine == "pcm" else 0.0
+        if preroll > 0 or self._warm:
+            try:
+                self._pcm.arm(preroll)
+            except RuntimeError as exc:
+                print(f"AnkiVoiceRecorder could not keep the input open: {exc}")
+        elif self._pcm.armed:
+            self._pcm.disarm()
+
+    def play_last(self) -> None:
+        # Falls back to the history after a restart, when no take was made yet.
+        path = self._last_path or self._history_ring().get(0)
+        if path is None:
+            showWarning("No recording available yet.")
+            return
+        self._history.cursor = 0
+        self._play(path, "last recording")
+
+    def play_recent(self, age: int) -> None:
+        """Play the take ``age`` steps before the newest one (1 = second last)."""
+        path = self._history_ring().seek(age)
+        if path is None:
+            tooltip(f"No {_ordinal(age + 1)} last recording yet.", parent=mw, period=2000)
+            return
+        self._play(path, f"{_ordinal(age + 1)} last recording")
+
+    def step_history(self, delta: int) -> None:
+        """Play the take ``delta`` steps older (negative: newer) than the one last played."""
+        ring = self._history_ring()
+        path = ring.step(delta)
+        if path is None:
+            tooltip("No older recording." if delta > 0 else "No newer recording.", parent=mw, period=1500)
+            return
+        label = "last recording" if ring.cursor == 0 else f"{_ordinal(ring.cursor + 1)} last recording"
+        self._play(path, label)
+
+    def _history_ring(self) -> history.History:
+        # A new history_size only reshapes what is in memory; the index is
+        # never read again, so it can't race with takes being indexed.
+        self._history.resize(config.settings().history_size)
+        return self._history
+
+    def _play(self, path: Path, label: str) -> None:
+        # The first file access for a history entry happens here.
+        if not path.exists():
+            showWarning(f"Recording file is missing: {path.name}")
+            return
+        if self._post.is_pending(path):
+            tooltip("Recording is still being processed.", parent=mw, period=2000)
+            return
+        self._player.setSource(QUrl.fromLocalFile(str(path)))
+        self._player.play()
+        tooltip(f"Playing {label}", parent=mw, period=2000)
+
+
+def _ordinal(number: int) -> str:
+    suffix = "th" if 11 <= number % 100 <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+
+def _take_context(names: bool) -> naming.TakeContext:
+    # The card being reviewed, if any. Its IDs are attributes the index
+    # always wants; the deck name and sort field cost a lookup and a note
+    # load, so they're only fetched for templates that use them.
+    card = mw.reviewer.card if mw.state == "review" else None
+    if card is None:
+        return naming.TakeContext()
+    if not names:
+        return naming.TakeContext(deck_id=card.did, note=card.nid, card=card.id)
+    note = card.note()
+    return naming.TakeContext(
+        deck=mw.col.decks.name(card.did),
+        deck_id=card.did,
+        note=note.id,
+        card=card.id,
+        field=strip_html(note.fields[note.note_type()["sortf"]]),
+    )
+
+
+def _amplify_wav(path: Path, gain: float) -> None:
+    # Block-based gain pass so long takes don't spike memory inside Anki.
+    if not path.exists():
+        return
+    wavproc.amplify_wav(path, gain)
+
+
+def _live_chain(width: int, channels: int, rate: int, settings: config.Settings, gain: float) -> stages.Chain:
+    # Built per take once the negotiated capture format is known.
+    chain: list[stages.Stage] = []
+    if settings.dc_removal:
+        chain.append(stages.DCBlocker(width, channels, rate))
+    if settings.compressor:
+        chain.append(_compressor(width, channels, rate, settings))
+    chain.append(_gain_stage(width, channels, rate, settings, gain))
+    return stages.Chain(chain)
+
+
+def _compressor(width: int, channels: int, rate: int, settings: config.Settings) -> stages.Compressor:
+    return stages.Compressor(
+        width, channels, rate, settings.compressor_threshold_db, settings.compressor_ratio
+    )
+
+
+def _gain_stage(width: int, channels: int, rate: int, settings: config.Settings, gain: float) -> stages.Stage:
+    # Only a boost can push samples past full scale, so only then is the
+    # limiter's look-ahead worth paying for.
+    if settings.limiter and gain > 1.0:
+        return stages.Limiter(width, channels, rate, gain, settings.peak_ceiling_db)
+    return stages.Gain(width, channels, rate, gain)
+
+
+def _choose_output(settings: config.Settings, native: bool) -> str:
+    # The first preference this take can be written in. The backend is only
+    # probed when a compressed format comes up, and only once per session.
+    for name in settings.output_format:
+        if name in ("wav", "flac"):
+            return name
+        if native and name in mediaformats.supported():
+            return name
+    return "wav"
+
+
+def _post_process(
+    path: Path,
+    settings: config.Settings,
+    live: bool,
+    output: str = "wav",
+    index: dedup.HashIndex | None = None,
+    recordings: library.RecordingLibrary | None = None,
+    take: library.TakeInfo | None = None,
+) -> Path:
+    # Runs on the post-processing thread: no mw, config or widget access here.
+    # Raises ValueError for files that aren't plain PCM WAV; the worker
+    # reports that as a failed post-process and the take is kept as recorded.
+    # Returns where the take ended up.
+    if not path.exists():
+        return path
+    stats = None
+    if output in mediaformats.NATIVE_FORMATS:
+        digest = dedup.file_digest(path) if index is not None else None
+    else:
+        _process_samples(path, settings, live)
+        layout = wavproc.read_layout(path)
+        hasher = dedup.pcm_hasher(layout.sampwidth, layout.channels, layout.rate) if index is not None else None
+        # One read of the final samples gives the index its numbers and dedup its key.
+        stats = library.measure_wav(path, layout, hasher)
+        digest = hasher.hexdigest() if hasher is not None else None
+        if output == "flac" and layout.sampwidth in flac.SUPPORTED_WIDTHS:
+            # Last, so every pass above still works on the WAV in place.
+            path = _encode_flac(path, layout)
+        elif output == "flac":
+            print(f"AnkiVoiceRecorder: keeping {path.name} as WAV, FLAC output goes up to 24-bit")
+    if digest is not None:
+        stored, duplicate = dedup.store(path, digest, index)
+        if duplicate:
+            print(f"AnkiVoiceRecorder: {path.name} duplicates {stored.name}, kept one copy")
+        path = stored
+    if recordings is not None:
+        recordings.add(path, take or library.TakeInfo(created=time.time()), stats)
+    return path
+
+
+def _process_samples(path: Path, settings: config.Settings, live: bool) -> None:
+    if settings.trim_silence:
+        # First, so the passes below only touch what is kept.
+        _trim_silence(path, settings)
+    layout = wavproc.read_layout(path)
+    fmt = (layout.sampwidth, layout.channels, layout.rate)
+    head = _auto_mono(path, layout, settings)
+    # Live takes were converted and compressed while recording; the rest of
+    # this covers QMediaRecorder takes.
+    if not live:
+        head += _conversions(head[-1].output_format if head else fmt, settings)
+    if head:
+        fmt = head[-1].output_format
+    if settings.compressor and not live:
+        head.append(_compressor(*fmt, settings))
+    gain = 1.0 if live else settings.gain
+    if settings.normalize != "off":
+        if head:
+            # Normalization has to measure the converted, compressed signal.
+            _apply_stages(path, stages.Chain(head), layout)
+            layout = wavproc.read_layout(path)
+            head = []
+        # Normalization replaces the fixed gain: measure, then scale once.
+        stats = loudness.analyze_wav(path)
+        # In loudness mode the limiter holds the peaks, so headroom doesn't cap the gain.
+        ceiling_db = math.inf if settings.limiter and settings.normalize == "loudness" else settings.peak_ceiling_db
+        gain = loudness.normalization_gain(stats, settings.normalize, settings.target_lufs, ceiling_db)
+        print(
+            f"AnkiVoiceRecorder loudness {path.name}: {stats.integrated_lufs:.1f} LUFS, "
+            f"true peak {stats.true_peak_dbtp:.1f} dBTP -> gain {loudness.to_db(gain):+.1f} dB"
+        )
+    tail = _gain_stage(*fmt, settings, gain) if gain != 1.0 else None
+    if not head and not isinstance(tail, stages.Limiter):
+        if tail is not None:
+            # A plain gain change keeps the in-place fast path.
+            _amplify_wav(path, gain)
+        return
+    chain = stages.Chain(head + ([tail] if tail is not None else []))
+    _apply_stages(path, chain, layout)
+    if isinstance(tail, stages.Limiter):
+        print(
+            f"AnkiVoiceRecorder limiter {path.name}: {tail.clipped_in} clipped in input, "
+            f"{tail.would_clip} would have clipped"
+        )
+
+
+def _auto_mono(path: Path, layout: wavproc.WavLayout, settings: config.Settings) -> list[stages.Stage]:
+    if not settings.auto_mono or settings.channels or layout.channels < 2:
+        return []
+    weights = downmix.mono_weights(downmix.survey(path, layout))
+    if weights is None:
+        return []
+    print(f"AnkiVoiceRecorder mono {path.name}: {downmix.describe(weights)}")
+    return [stages.Remix(layout.sampwidth, layout.channels, layout.rate, 1, weights)]
+
+
+def _conversions(fmt: tuple[int, int, int], settings: config.Settings) -> list[stages.Stage]:
+    # QMediaRecorder only takes rate/channel hints, and backends may ignore them.
+    wanted = (settings.bit_depth // 8, settings.channels, settings.sample_rate)
+    stored = tuple(want or got for want, got in zip(wanted, fmt))
+    return stages.conversion_stages(*fmt, *stored)
+
+
+def _apply_stages(path: Path, chain: stages.Chain, layout: wavproc.WavLayout) -> None:
+    if chain.output_format == (layout.sampwidth, layout.channels, layout.rate):
+        wavproc.process_wav(path, chain)
+    else:
+        before = (layout.sampwidth, layout.channels, layout.rate)
+        wavproc.convert_wav(path, chain)
+        print(f"AnkiVoiceRecorder converted {path.name}: {before} -> {chain.output_format} (width, channels, rate)")
+
+
+def _encode_flac(path: Path, layout: wavproc.WavLayout) -> Path:
+    size = path.stat().st_size
+    encoded = flac.encode_wav(path, layout=layout)
+    print(f"AnkiVoiceRecorder flac {encoded.name}: {encoded.stat().st_size / size:.0%} of the WAV size")
+    return encoded
+
+
+def _trim_silence(path: Path, settings: config.Settings) -> None:
+    layout = wavproc.read_layout(path)
+    bounds = vad.speech_bounds(path, settings.trim_padding_ms / 1000, layout)
+    if bounds is None:
+        # No speech found: keep the take as recorded rather than emptying it.
+        return
+    start, end = bounds
+    total = layout.data_size // layout.block_align
+    wavproc.trim_wav(path, start, end, layout)
+    print(
+        f"AnkiVoiceRecorder trim {path.name}: cut {start / layout.rate:.2f} s head, "
+        f"{(total - end) / layout.rate:.2f} s tail"
+    )
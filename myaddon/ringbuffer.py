@@ -0,0 +1,52 @@
+"""Fixed-capacity byte ring used for pre-roll audio."""
+
+from __future__ import annotations
+
+
+class RingBuffer:
+    """Keep the most recent ``capacity`` bytes written.
+
+    Storage is a single ``bytearray`` allocated up front, so memory use is
+    fixed no matter how long the buffer stays armed. ``align`` keeps the
+    capacity a whole number of frames so reads never start mid-sample.
+    """
+
+    def __init__(self, capacity: int, align: int = 1) -> None:
+        capacity -= capacity % align
+        if capacity <= 0:
+            raise ValueError("ring buffer capacity must hold at least one frame")
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._write = 0
+        self._filled = 0
+
+    def __len__(self) -> int:
+        return self._filled
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        if len(view) >= self.capacity:
+            # Only the tail can survive; store it as a full, unwrapped buffer.
+            self._buffer[:] = view[len(view) - self.capacity :]
+            self._write = 0
+            self._filled = self.capacity
+            return
+        first = min(len(view), self.capacity - self._write)
+        self._buffer[self._write : self._write + first] = view[:first]
+        rest = len(view) - first
+        if rest:
+            self._buffer[:rest] = view[first:]
+        self._write = (self._write + len(view)) % self.capacity
+        self._filled = min(self.capacity, self._filled + len(view))
+
+    def read(self) -> bytes:
+        """Buffered bytes, oldest first."""
+        start = (self._write - self._filled) % self.capacity
+        end = start + self._filled
+        if end <= self.capacity:
+            return bytes(self._buffer[start:end])
+        return bytes(self._buffer[start:]) + bytes(self._buffer[: end - self.capacity])
+
+    def clear(self) -> None:
+        self._write = 0
+        self._filled = 0
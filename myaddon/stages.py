@@ -0,0 +1,604 @@
+"""Block processors shared by live capture and file post-processing.
+
+A stage receives interleaved PCM fragments in the WAV byte layout and returns
+processed fragments. Stages may hold state across calls, so one instance
+handles exactly one stream; ``flush`` drains anything still buffered at the
+end of that stream.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from functools import lru_cache
+import math
+
+from . import dsp
+from .dsp import np
+
+
+class Stage:
+    def __init__(self, width: int, channels: int, rate: int, backend: dsp.Backend | None = None) -> None:
+        self.width = width
+        self.channels = channels
+        self.rate = rate
+        self.backend = backend or dsp.get_backend()
+
+    def process(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        return b""
+
+    @property
+    def output_format(self) -> tuple[int, int, int]:
+        """``(width, channels, rate)`` of the fragments this stage returns."""
+        return self.width, self.channels, self.rate
+
+    def _frames(self, data: bytes) -> int:
+        return len(data) // (self.width * self.channels)
+
+
+class Gain(Stage):
+    """Fixed gain with saturation, the live counterpart of ``amplify_wav``."""
+
+    def __init__(self, width: int, channels: int, rate: int, gain: float, backend: dsp.Backend | None = None) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.gain = gain
+
+    def process(self, data: bytes) -> bytes:
+        if self.gain == 1.0:
+            return data
+        return self.backend.mul(data, self.width, self.gain)
+
+
+class DCBlocker(Stage):
+    """Remove a slowly drifting DC offset.
+
+    Works per block rather than per sample: each block's mean feeds an
+    exponential average with time constant ``tau`` seconds, which is then
+    subtracted. That keeps it to two vectorized backend calls per block.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        tau: float = 0.5,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.tau = tau
+        self._offset: float | None = None
+
+    def process(self, data: bytes) -> bytes:
+        frames = self._frames(data)
+        if not frames:
+            return data
+        mean = self.backend.mean(data, self.width)
+        if self._offset is None:
+            self._offset = mean
+        else:
+            coeff = 1.0 - math.exp(-frames / (self.rate * self.tau))
+            self._offset += (mean - self._offset) * coeff
+        return self.backend.add(data, self.width, -round(self._offset))
+
+
+class Limiter(Stage):
+    """Look-ahead peak limiter with an optional gain in front of it.
+
+    Replaces plain gain plus hard clipping. The gain envelope is computed per
+    granule (about 0.5 ms): each granule's required gain is ``ceiling / peak``,
+    a sliding minimum over ``attack + hold`` granules spreads every reduction
+    over the surrounding audio, and a sliding mean over ``attack`` granules
+    turns it into a ramp. Because every averaged window contains the granule
+    being scaled, no output sample can exceed the ceiling. Output lags input
+    by ``attack`` granules; ``flush`` returns the tail.
+
+    ``clipped_in`` counts input samples already at full scale, ``would_clip``
+    the samples plain gain would have clipped. The ceiling sits one step
+    below full scale, so the output never clips and has nothing to count.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        gain: float = 1.0,
+        ceiling_db: float = -1.0,
+        attack: float = 0.005,
+        hold: float = 0.04,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.gain = gain
+        self._full_scale = dsp.sample_limits(width)[1]
+        # One step of headroom: mul rounds toward -inf, so negative samples can
+        # land one step past the exact ceiling.
+        self._ceiling = math.floor(self._full_scale * min(1.0, 10 ** (ceiling_db / 20))) - 1
+        granule_frames = max(1, rate // 2000)
+        self._group = granule_frames * channels
+        self._group_bytes = self._group * width
+        self._attack = max(1, round(attack * rate / granule_frames))
+        self._window = self._attack + max(0, round(hold * rate / granule_frames))
+        # Required gains of the granules just before the pending audio.
+        self._history = [1.0] * (self._window - 1)
+        self._pending = b""
+        # Leading bytes of _pending whose overs were already counted.
+        self._counted = 0
+        self.clipped_in = 0
+        self.would_clip = 0
+
+    def process(self, data: bytes) -> bytes:
+        buffer = self._pending + data
+        granules = len(buffer) // self._group_bytes
+        ready = granules - (self._attack - 1)
+        if ready <= 0:
+            self._pending = buffer
+            return b""
+        measured = buffer[: granules * self._group_bytes]
+        peaks = self.backend.group_peaks(measured, self.width, self._group)
+        self._count_input(measured[self._counted :], peaks)
+        # Peaks at or below this level pass untouched.
+        limit = self._ceiling / self.gain
+        if max(peaks) <= limit:
+            required = [1.0] * len(peaks)
+        else:
+            required = [1.0 if p <= limit else limit / p for p in peaks]
+        envelope = _sliding_mean(_sliding_min(self._history + required, self._window), self._attack)[:ready]
+        gains = [self.gain * g for g in envelope]
+        out = self.backend.mul_groups(buffer[: ready * self._group_bytes], self.width, gains, self._group)
+        # Indices line up because history is exactly window - 1 granules long.
+        self._history = (self._history + required)[ready : ready + self._window - 1]
+        self._pending = buffer[ready * self._group_bytes :]
+        self._counted = (self._attack - 1) * self._group_bytes
+        return out
+
+    def flush(self) -> bytes:
+        tail = len(self._pending)
+        if not tail:
+            return b""
+        # Silence that completes the last granule and fills the look-ahead.
+        silence = b"\x80" if self.width == 1 else bytes(self.width)
+        padding = (-tail) % self._group_bytes + (self._attack - 1) * self._group_bytes
+        return self.process(silence * (padding // self.width))[:tail]
+
+    def _count_input(self, fresh: bytes, peaks: list[int]) -> None:
+        # Only granules whose peak says they might contain overs are scanned.
+        offset = len(peaks) - len(fresh) // self._group_bytes
+        threshold = math.ceil(self._full_scale / self.gain) if self.gain > 1.0 else None
+        lowest = min(self._full_scale, threshold or self._full_scale)
+        fresh_peaks = peaks[offset:]
+        if not fresh_peaks or max(fresh_peaks) < lowest:
+            return
+        gb = self._group_bytes
+        over_full = b"".join(fresh[i * gb : (i + 1) * gb] for i, p in enumerate(fresh_peaks) if p >= self._full_scale)
+        if over_full:
+            self.clipped_in += self.backend.count_over(over_full, self.width, self._full_scale)
+        if threshold is not None:
+            # One backend call over just the granules that can contain overs.
+            over_gain = b"".join(fresh[i * gb : (i + 1) * gb] for i, p in enumerate(fresh_peaks) if p >= threshold)
+            if over_gain:
+                self.would_clip += self.backend.count_over(over_gain, self.width, threshold)
+
+
+class Compressor(Stage):
+    """Downward compressor driven by per-granule RMS (about 2 ms).
+
+    Levels above ``threshold_db`` are reduced by ``1 - 1/ratio``; the gain in
+    dB follows with separate attack/release time constants. It only ever
+    reduces level, so it can't clip; put a ``Limiter`` after it for make-up
+    gain. A ratio of 1 passes the audio through untouched.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        threshold_db: float = -24.0,
+        ratio: float = 3.0,
+        attack: float = 0.01,
+        release: float = 0.15,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.threshold_db = threshold_db
+        self.slope = 1.0 - 1.0 / max(1.0, ratio)
+        granule_frames = max(1, rate // 500)
+        self._group = granule_frames * channels
+        self._group_bytes = self._group * width
+        step = granule_frames / rate
+        self._attack = math.exp(-step / attack)
+        self._release = math.exp(-step / release)
+        self._full_scale = dsp.sample_limits(width)[1]
+        self._gain_db = 0.0
+        self._pending = b""
+
+    def process(self, data: bytes) -> bytes:
+        buffer = self._pending + data
+        usable = len(buffer) - len(buffer) % self._group_bytes
+        self._pending = buffer[usable:]
+        return self._compress(buffer[:usable])
+
+    def flush(self) -> bytes:
+        tail, self._pending = self._pending, b""
+        return self._compress(tail)
+
+    def _compress(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        if not self.slope:
+            # Ratio 1: no gain to compute, and silence would give inf * 0 in the curve.
+            return data
+        levels = self.backend.group_rms(data, self.width, self._group)
+        # Static curve first (vectorized where possible), then the attack/
+        # release recursion, which has to run granule by granule.
+        targets = _compressor_targets(levels, self._full_scale, self.threshold_db, self.slope)
+        smoothed = []
+        gain_db = self._gain_db
+        attack, release = self._attack, self._release
+        for target in targets:
+            gain_db = target + (gain_db - target) * (attack if target < gain_db else release)
+            smoothed.append(gain_db)
+        self._gain_db = gain_db
+        return self.backend.mul_groups(data, self.width, _db_to_gain(smoothed), self._group)
+
+
+def _compressor_targets(levels: list[float], full_scale: int, threshold_db: float, slope: float) -> list[float]:
+    """Gain in dB the static compression curve asks for at each RMS level."""
+    if np is not None:
+        with np.errstate(divide="ignore"):
+            level_db = 20 * np.log10(np.asarray(levels, dtype=np.float64) / full_scale)
+        return np.minimum(0.0, (threshold_db - level_db) * slope).tolist()
+    out = []
+    for rms in levels:
+        level_db = 20 * math.log10(rms / full_scale) if rms > 0 else -math.inf
+        out.append(min(0.0, (threshold_db - level_db) * slope))
+    return out
+
+
+def _db_to_gain(values: list[float]) -> list[float]:
+    if np is not None:
+        return np.power(10.0, np.asarray(values, dtype=np.float64) / 20).tolist()
+    return [10 ** (v / 20) for v in values]
+
+
+def _sliding_min(values: list[float], window: int) -> list[float]:
+    """Minimum of each full ``window``-long run (van Herk/Gil-Werman with NumPy)."""
+    if window <= 1:
+        return list(values)
+    count = len(values) - window + 1
+    if count <= 0:
+        return []
+    if np is not None:
+        array = np.asarray(values, dtype=np.float64)
+        padded = np.concatenate((array, np.full((-array.size) % window, np.inf))).reshape(-1, window)
+        prefix = np.minimum.accumulate(padded, axis=1).ravel()
+        suffix = np.minimum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        return np.minimum(suffix[:count], prefix[window - 1 : window - 1 + count]).tolist()
+    out = []
+    candidates: deque[int] = deque()
+    for index, value in enumerate(values):
+        while candidates and values[candidates[-1]] >= value:
+            candidates.pop()
+        candidates.append(index)
+        if candidates[0] <= index - window:
+            candidates.popleft()
+        if index >= window - 1:
+            out.append(values[candidates[0]])
+    return out
+
+
+def _sliding_mean(values: list[float], window: int) -> list[float]:
+    """Mean of each full ``window``-long run."""
+    if window <= 1:
+        return list(values)
+    count = len(values) - window + 1
+    if count <= 0:
+        return []
+    if np is not None:
+        sums = np.cumsum(np.concatenate(([0.0], np.asarray(values, dtype=np.float64))))
+        return ((sums[window:] - sums[:count]) / window).tolist()
+    out = []
+    total = math.fsum(values[: window - 1])
+    for index in range(window - 1, len(values)):
+        total += values[index]
+        out.append(total / window)
+        total -= values[index - window + 1]
+    return out
+
+
+class Remix(Stage):
+    """Change the channel count (stereo to mono averages, mono to stereo copies).
+
+    ``weights`` (one per input channel) replaces the plain average when
+    mixing down to mono, e.g. ``(1.0, 0.0)`` keeps only the left channel.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        out_channels: int,
+        weights: tuple[float, ...] | None = None,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.out_channels = out_channels
+        self.weights = weights if out_channels == 1 else None
+
+    @property
+    def output_format(self) -> tuple[int, int, int]:
+        return self.width, self.out_channels, self.rate
+
+    def process(self, data: bytes) -> bytes:
+        if not data:
+            return data
+        if self.weights is not None:
+            return self.backend.mix_down(data, self.width, self.weights)
+        return self.backend.remix(data, self.width, self.channels, self.out_channels)
+
+
+class Requantize(Stage):
+    """Change the sample width, e.g. 32-bit capture stored as 16-bit."""
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        out_width: int,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.out_width = out_width
+
+    @property
+    def output_format(self) -> tuple[int, int, int]:
+        return self.out_width, self.channels, self.rate
+
+    def process(self, data: bytes) -> bytes:
+        if not data:
+            return data
+        return self.backend.convert_width(data, self.width, self.out_width)
+
+
+class Resample(Stage):
+    """Streaming sample-rate conversion with a polyphase FIR filter.
+
+    Output sample ``k`` sits at input position ``k * rate / out_rate``; the
+    position is kept as an exact integer fraction so long takes don't drift,
+    and its fractional part selects one row (phase) of a cached filter table.
+    ``kind="sinc"`` uses a Kaiser-windowed sinc low-pass that also removes
+    everything above the new Nyquist frequency; ``kind="linear"`` is plain
+    linear interpolation. Sinc is the default with NumPy; without it the
+    per-sample Python loop makes linear the only practical choice.
+
+    Enough input is carried between calls for the filter to span block
+    boundaries, and ``flush`` runs the filter off the end of the take, so
+    output is exactly ``ceil(frames * out_rate / rate)`` frames long. The
+    NumPy path sums in a different order than the Python loop, so the two
+    may differ in the last bit.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        out_rate: int,
+        *,
+        kind: str | None = None,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        super().__init__(width, channels, rate, backend)
+        self.out_rate = out_rate
+        self.kind = kind or ("sinc" if np is not None else "linear")
+        divisor = math.gcd(rate, out_rate)
+        # Positions are counted in units of 1/_den input frames.
+        self._step = rate // divisor
+        self._den = out_rate // divisor
+        self._table = _resample_table(self._step, self._den, self.kind)
+        self._half = len(self._table[0]) // 2
+        self._np_table = np.asarray(self._table) if np is not None else None
+        self._limits = dsp.sample_limits(width)
+        self._frame_bytes = width * channels
+        self._silence = (b"\x80" if width == 1 else b"\0") * self._frame_bytes
+        # Start with half a filter of silence so output 0 lines up with input 0.
+        self._carry = self._silence * (self._half - 1)
+        self._next = (self._half - 1) * self._den
+        self._frames_in = 0
+        self._frames_out = 0
+
+    @property
+    def output_format(self) -> tuple[int, int, int]:
+        return self.width, self.channels, self.out_rate
+
+    def process(self, data: bytes) -> bytes:
+        data = data[: len(data) - len(data) % self._frame_bytes]
+        self._frames_in += len(data) // self._frame_bytes
+        out = self._run(data)
+        self._frames_out += len(out) // self._frame_bytes
+        return out
+
+    def flush(self) -> bytes:
+        expected = -(-self._frames_in * self._den // self._step)
+        missing = max(0, expected - self._frames_out)
+        if not missing:
+            return b""
+        # Enough trailing silence for the last outputs to see a full filter.
+        pad = self._half + missing * self._step // self._den + 1
+        out = self._run(self._silence * pad)[: missing * self._frame_bytes]
+        self._frames_out += missing
+        return out
+
+    def _run(self, data: bytes) -> bytes:
+        data = self._carry + data
+        frames = len(data) // self._frame_bytes
+        # The last output computable now needs ``half`` frames after it.
+        last = (frames - 1 - self._half) * self._den
+        count = (last - self._next) // self._step + 1 if self._next <= last else 0
+        if not count:
+            self._carry = data
+            return b""
+        if self._np_table is not None:
+            out = self._filter_np(data, frames, count)
+        else:
+            out = self._filter_py(data, count)
+        self._next += count * self._step
+        # Drop input no later output needs (the next one may lie past the end).
+        keep = min(frames, self._next // self._den - (self._half - 1))
+        self._next -= keep * self._den
+        self._carry = data[keep * self._frame_bytes :]
+        return out
+
+    def _filter_np(self, data: bytes, frames: int, count: int) -> bytes:
+        values = dsp.NumpyBackend.decode(data, self.width).reshape(frames, self.channels).astype(np.float64)
+        taps = 2 * self._half
+        if taps == 2:
+            # Linear: two multiply-adds across all outputs beat a loop over
+            # up to _den phases.
+            positions = self._next + self._step * np.arange(count, dtype=np.int64)
+            index, phase = np.divmod(positions, self._den)
+            index -= self._half - 1
+            coeffs = self._np_table[phase]
+            out = np.zeros((count, self.channels))
+            for tap in range(taps):
+                out += coeffs[:, tap, None] * values[index + tap]
+        else:
+            # The phase repeats every _den outputs while the window moves on by
+            # _step frames, so each phase is one strided matrix product over a
+            # sliding-window view.
+            windows = np.lib.stride_tricks.sliding_window_view(values, taps, axis=0)
+            out = np.empty((count, self.channels))
+            for first in range(min(self._den, count)):
+                index, phase = divmod(self._next + self._step * first, self._den)
+                index -= self._half - 1
+                outputs = len(range(first, count, self._den))
+                selected = windows[index : index + self._step * (outputs - 1) + 1 : self._step]
+                out[first :: self._den] = selected @ self._np_table[phase]
+        np.floor(out, out=out)
+        np.clip(out, *self._limits, out=out)
+        return dsp.NumpyBackend.encode(out.astype(np.int64).reshape(-1), self.width)
+
+    def _filter_py(self, data: bytes, count: int) -> bytes:
+        values = dsp.ArrayBackend.decode(data, self.width)
+        channels, den, floor = self.channels, self._den, math.floor
+        lo, hi = self._limits
+        out = []
+        position = self._next
+        for _ in range(count):
+            index, phase = divmod(position, den)
+            coeffs = self._table[phase]
+            base = (index - self._half + 1) * channels
+            for c in range(channels):
+                acc = 0.0
+                offset = base + c
+                for coeff in coeffs:
+                    acc += coeff * values[offset]
+                    offset += channels
+                out.append(min(hi, max(lo, floor(acc))))
+            position += self._step
+        return dsp.ArrayBackend.encode(out, self.width)
+
+
+# Windowed-sinc design: zero crossings on each side of the centre (at the
+# lower of the two rates), Kaiser window shape, and the pass band as a
+# fraction of the lower Nyquist frequency.
+SINC_ZERO_CROSSINGS = 32
+SINC_KAISER_BETA = 8.6
+SINC_ROLLOFF = 0.9
+
+
+@lru_cache(maxsize=16)
+def _resample_table(step: int, den: int, kind: str) -> tuple[tuple[float, ...], ...]:
+    """Filter taps for each of the ``den`` phases of a ``step/den`` resampler.
+
+    Row ``p`` holds the weights of the ``2 * half`` input frames around an
+    output that falls ``p / den`` of a frame after input frame ``half - 1``
+    of the window. Every row sums to one.
+    """
+    if kind == "linear":
+        return tuple((1 - p / den, p / den) for p in range(den))
+    if kind != "sinc":
+        raise ValueError(f"unknown resampler kind {kind!r}")
+    ratio = min(1.0, den / step)
+    cutoff = ratio * SINC_ROLLOFF
+    half = math.ceil(SINC_ZERO_CROSSINGS / ratio)
+    norm = _bessel_i0(SINC_KAISER_BETA)
+    rows = []
+    for p in range(den):
+        row = []
+        for tap in range(2 * half):
+            t = p / den + half - 1 - tap
+            x = t / half
+            window = _bessel_i0(SINC_KAISER_BETA * math.sqrt(1 - x * x)) / norm if abs(x) < 1 else 0.0
+            arg = math.pi * cutoff * t
+            row.append((math.sin(arg) / arg if arg else 1.0) * window)
+        total = math.fsum(row)
+        rows.append(tuple(v / total for v in row))
+    return tuple(rows)
+
+
+def _bessel_i0(x: float) -> float:
+    # Power series; converges quickly for the window's argument range.
+    term = total = 1.0
+    k = 1
+    while term > total * 1e-16:
+        term *= (x / (2 * k)) ** 2
+        total += term
+        k += 1
+    return total
+
+
+def conversion_stages(
+    width: int,
+    channels: int,
+    rate: int,
+    out_width: int,
+    out_channels: int,
+    out_rate: int,
+    backend: dsp.Backend | None = None,
+) -> list[Stage]:
+    """Stages turning one PCM format into another; empty when they match.
+
+    Channels are reduced first and the width changed last, so resampling
+    touches as few samples as possible.
+    """
+    out: list[Stage] = []
+    if out_channels != channels:
+        out.append(Remix(width, channels, rate, out_channels, backend=backend))
+        channels = out_channels
+    if out_rate != rate:
+        out.append(Resample(width, channels, rate, out_rate, backend=backend))
+        rate = out_rate
+    if out_width != width:
+        out.append(Requantize(width, channels, rate, out_width, backend=backend))
+    return out
+
+
+class Chain(Stage):
+    """Run stages in order; a chain is itself a stage."""
+
+    def __init__(self, stages: list[Stage]) -> None:
+        self.stages = stages
+
+    @property
+    def output_format(self) -> tuple[int, int, int]:
+        return self.stages[-1].output_format
+
+    def process(self, data: bytes) -> bytes:
+        for stage in self.stages:
+            data = stage.process(data)
+        return data
+
+    def flush(self) -> bytes:
+        # Each stage's tail still has to pass through the stages after it.
+        tail = b""
+        for stage in self.stages:
+            tail = stage.process(tail) if tail else b""
+            tail += stage.flush()
+        return tail
@@ -0,0 +1,252 @@
+"""Energy / zero-crossing voice activity detection for trimming takes.
+
+Audio is cut into 10 ms frames described by their RMS level and number of
+zero crossings. Thresholds follow Rabiner & Sambur's endpoint detector: a
+low and a high energy threshold derived from the noise floor locate the
+voiced part, then the boundary is pushed outwards over nearby frames with a
+high crossing rate so quiet fricatives ("s", "f") at the edges survive.
+
+``speech_bounds`` reads the file from both ends, one chunk at a time, and
+stops as soon as it reaches speech, so only the leading and trailing
+silence (plus a chunk) is ever decoded. ``SilenceDetector`` is the live
+counterpart used for auto-stop: one RMS per captured buffer against a
+tracked noise floor.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from . import dsp
+from .wavproc import WavLayout, read_layout
+
+FRAME_SECONDS = 0.01
+# Audio decoded per read while walking in from either end.
+SCAN_SECONDS = 1.0
+# Nothing quieter than this counts as signal, even in a digitally silent take.
+MIN_LEVEL_DB = -70.0
+# How far outside the energy boundary unvoiced speech is looked for, and how
+# many high-crossing frames it takes to move the boundary.
+CROSSING_LOOKBACK_FRAMES = 25
+CROSSING_MIN_FRAMES = 3
+# Rabiner & Sambur's upper bound for the crossing threshold (per channel).
+MAX_CROSSINGS_PER_FRAME = 25.0
+# Unvoiced frames still have to stand this far above the noise floor, so
+# hiss with a high crossing rate of its own doesn't extend the boundary.
+UNVOICED_LEVEL_RATIO = 1.4
+
+# Live detection: a buffer is speech this far above the noise floor and
+# silence below SILENCE_RATIO; in between keeps the current state.
+SPEECH_RATIO = 4.0
+SILENCE_RATIO = 2.0
+# Speech needed before silence can end a take, so a cough or click at the
+# start doesn't arm auto-stop.
+MIN_SPEECH_SECONDS = 0.2
+# The noise floor drops to any quieter buffer at once but rises this slowly.
+NOISE_RISE_SECONDS = 5.0
+# Where the noise floor starts: about the hiss of a quiet room on a typical
+# microphone. Starting from the first buffer instead would lose any take
+# whose first buffer is already speech, which pre-roll makes the usual case.
+NOISE_PRIOR_DB = -50.0
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    noise: float
+    low: float
+    high: float
+    crossings: float
+
+
+def estimate_thresholds(levels: list[float], crossings: list[float], full_scale: int) -> Thresholds:
+    """Thresholds from frames that include some leading or trailing silence.
+
+    The quietest tenth of the frames stands in for the noise floor.
+    """
+    floor = full_scale * 10 ** (MIN_LEVEL_DB / 20)
+    order = sorted(range(len(levels)), key=levels.__getitem__)
+    quiet = order[: max(1, len(order) // 10)]
+    noise = max(floor, sum(levels[i] for i in quiet) / len(quiet))
+    peak = max(levels, default=0.0)
+    low = max(2 * noise, min(0.03 * (peak - noise) + noise, 4 * noise))
+    rates = [crossings[i] for i in quiet]
+    mean = sum(rates) / len(rates)
+    spread = (sum((r - mean) ** 2 for r in rates) / len(rates)) ** 0.5
+    return Thresholds(
+        noise=noise,
+        low=low,
+        high=4 * low,
+        crossings=min(MAX_CROSSINGS_PER_FRAME, mean + 2 * spread),
+    )
+
+
+def find_onset(frames: Iterator[tuple[list[float], list[float]]], thresholds: Thresholds) -> int | None:
+    """Index of the first speech frame in ``frames`` (consumed lazily), or ``None``."""
+    levels: list[float] = []
+    crossings: list[float] = []
+    for chunk_levels, chunk_crossings in frames:
+        start = len(levels)
+        levels += chunk_levels
+        crossings += chunk_crossings
+        for index in range(start, len(levels)):
+            if levels[index] >= thresholds.high:
+                return _refine(levels, crossings, index, thresholds)
+    return None
+
+
+def _refine(levels: list[float], crossings: list[float], index: int, thresholds: Thresholds) -> int:
+    # Back off to where the energy first rose above the low threshold ...
+    while index > 0 and levels[index - 1] >= thresholds.low:
+        index -= 1
+    # ... then over any run of unvoiced, high-crossing frames just before it.
+    nearby = range(max(0, index - CROSSING_LOOKBACK_FRAMES), index)
+    quiet = thresholds.noise * UNVOICED_LEVEL_RATIO
+    unvoiced = [i for i in nearby if crossings[i] >= thresholds.crossings and levels[i] >= quiet]
+    if len(unvoiced) >= CROSSING_MIN_FRAMES:
+        index = unvoiced[0]
+    return index
+
+
+def speech_bounds(
+    path: Path,
+    pad_seconds: float = 0.0,
+    layout: WavLayout | None = None,
+    backend: dsp.Backend | None = None,
+) -> tuple[int, int] | None:
+    """``(start_frame, end_frame)`` of the speech in ``path``, widened by ``pad_seconds``.
+
+    Returns ``None`` when no speech is found, so callers leave the take alone.
+    """
+    backend = backend or dsp.get_backend()
+    if layout is None:
+        layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    total = layout.data_size // layout.block_align
+    if not total:
+        return None
+    frame = max(1, round(layout.rate * FRAME_SECONDS))
+    chunk = frame * max(1, round(SCAN_SECONDS / FRAME_SECONDS))
+    with open(path, "rb") as handle:
+        scan = _Scanner(handle, layout, frame, backend)
+        head_levels, head_crossings = scan.measure(0, min(chunk, total))
+        tail_start = max(0, total - chunk)
+        tail_levels, tail_crossings = scan.measure(tail_start, total)
+        thresholds = estimate_thresholds(
+            head_levels + tail_levels,
+            head_crossings + tail_crossings,
+            dsp.sample_limits(layout.sampwidth)[1],
+        )
+
+        def forwards() -> Iterator[tuple[list[float], list[float]]]:
+            yield head_levels, head_crossings
+            for start in range(chunk, total, chunk):
+                yield scan.measure(start, min(start + chunk, total))
+
+        onset = find_onset(forwards(), thresholds)
+        if onset is None:
+            return None
+        first = onset * frame
+
+        def backwards() -> Iterator[tuple[list[float], list[float]]]:
+            # Frames are laid out from the end of the take so that frame
+            # boundaries line up across chunks; the stub frame is at the front.
+            end = total
+            while end > first:
+                start = max(first, end - chunk)
+                levels, crossings = scan.measure_back(start, end)
+                yield levels, crossings
+                end = start
+
+        offset = find_onset(backwards(), thresholds)
+    last = total - offset * frame if offset is not None else total
+    pad = round(pad_seconds * layout.rate)
+    return max(0, first - pad), min(total, max(last, first) + pad)
+
+
+class _Scanner:
+    def __init__(self, handle: BinaryIO, layout: WavLayout, frame: int, backend: dsp.Backend) -> None:
+        self._handle = handle
+        self._layout = layout
+        self._frame = frame
+        self._backend = backend
+
+    def _read(self, start: int, end: int) -> bytes:
+        align = self._layout.block_align
+        self._handle.seek(self._layout.data_offset + start * align)
+        return self._handle.read((end - start) * align)
+
+    def _describe(self, data: bytes) -> tuple[list[float], list[float]]:
+        width, channels = self._layout.sampwidth, self._layout.channels
+        group = self._frame * channels
+        crossings = self._backend.group_crossings(data, width, group, channels)
+        return self._backend.group_rms(data, width, group), [c / channels for c in crossings]
+
+    def measure(self, start: int, end: int) -> tuple[list[float], list[float]]:
+        """Frames covering ``[start, end)``, in file order."""
+        return self._describe(self._read(start, end))
+
+    def measure_back(self, start: int, end: int) -> tuple[list[float], list[float]]:
+        """Frames covering ``[start, end)`` cut from ``end`` backwards, last frame first."""
+        data = self._read(start, end)
+        stub = ((end - start) % self._frame) * self._layout.block_align
+        levels, crossings = self._describe(data[stub:])
+        if stub:
+            stub_levels, stub_crossings = self._describe(data[:stub])
+            levels = stub_levels + levels
+            crossings = stub_crossings + crossings
+        return levels[::-1], crossings[::-1]
+
+
+class SilenceDetector:
+    """Report when ``silence_seconds`` of quiet follow some speech.
+
+    Fed every captured buffer. Each call costs one backend RMS and a few
+    float operations, cheap enough to run for the whole take.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        channels: int,
+        rate: int,
+        silence_seconds: float,
+        backend: dsp.Backend | None = None,
+    ) -> None:
+        self.width = width
+        self.silence_seconds = silence_seconds
+        self._frame_bytes = width * channels
+        self._rate = rate
+        self._backend = backend or dsp.get_backend()
+        full_scale = dsp.sample_limits(width)[1]
+        self._floor = full_scale * 10 ** (MIN_LEVEL_DB / 20)
+        self._noise = full_scale * 10 ** (NOISE_PRIOR_DB / 20)
+        self._speech = 0.0
+        self._silence = 0.0
+
+    def feed(self, data: bytes) -> bool:
+        """Account for ``data``; True once the take should stop."""
+        seconds = len(data) // self._frame_bytes / self._rate
+        if not seconds:
+            return False
+        level = max(self._floor, self._backend.rms(data, self.width))
+        if level < self._noise:
+            self._noise = level
+        else:
+            self._noise *= (level / self._noise) ** min(1.0, seconds / NOISE_RISE_SECONDS)
+        if level >= self._noise * SPEECH_RATIO:
+            self._speech += seconds
+            self._silence = 0.0
+        elif level < self._noise * SILENCE_RATIO and self._speech >= MIN_SPEECH_SECONDS:
+            self._silence += seconds
+        return self._speech >= MIN_SPEECH_SECONDS and self._silence >= self.silence_seconds
+
+    def feed_all(self, data: bytes) -> bool:
+        """``feed`` a long stretch (such as the pre-roll) in frame-sized pieces."""
+        step = max(1, round(self._rate * FRAME_SECONDS)) * self._frame_bytes
+        stop = False
+        for start in range(0, len(data), step):
+            stop = self.feed(data[start : start + step]) or stop
+        return stop
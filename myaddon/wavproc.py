@@ -0,0 +1,337 @@
+"""Streaming WAV post-processing used after a take has been recorded."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import TYPE_CHECKING
+import wave
+
+from . import dsp
+
+if TYPE_CHECKING:
+    from .stages import Stage
+
+# Frames handled per block in streaming passes. Peak memory is bounded by
+# one block (64 KiB for 16-bit stereo) no matter how long the take is.
+BLOCK_FRAMES = 16384
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass(frozen=True)
+class WavLayout:
+    """Where the samples live inside a RIFF/WAVE file and how they're encoded."""
+
+    format_tag: int
+    channels: int
+    rate: int
+    sampwidth: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.sampwidth
+
+    @property
+    def is_pcm(self) -> bool:
+        return self.format_tag == WAVE_FORMAT_PCM
+
+
+def read_layout(path: Path) -> WavLayout:
+    """Walk the RIFF chunk headers of ``path`` without reading sample data.
+
+    Raises ``ValueError`` for anything that isn't a RIFF/WAVE file with both a
+    ``fmt `` and a ``data`` chunk.
+    """
+    file_size = path.stat().st_size
+    with open(path, "rb") as handle:
+        riff = handle.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+        fmt: tuple[int, int, int, int] | None = None
+        offset = 12
+        while offset + 8 <= file_size:
+            handle.seek(offset)
+            chunk_id, chunk_size = struct.unpack("<4sI", handle.read(8))
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                fmt = parse_fmt(handle.read(min(chunk_size, 40)))
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                # Recorders that die mid-take leave 0 or 0xFFFFFFFF here.
+                available = file_size - body
+                if chunk_size == 0 or chunk_size > available:
+                    chunk_size = available
+                format_tag, channels, rate, bits = fmt
+                return WavLayout(
+                    format_tag=format_tag,
+                    channels=channels,
+                    rate=rate,
+                    sampwidth=(bits + 7) // 8,
+                    data_offset=body,
+                    data_size=chunk_size,
+                )
+            # Chunks are padded to an even length.
+            offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("no data chunk")
+
+
+def parse_fmt(body: bytes) -> tuple[int, int, int, int]:
+    """(format tag, channels, rate, bits) from the body of a ``fmt `` chunk."""
+    if len(body) < 16:
+        raise ValueError("truncated fmt chunk")
+    format_tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+        # The real format tag is the first two bytes of the SubFormat GUID.
+        (format_tag,) = struct.unpack("<H", body[24:26])
+    if channels == 0 or bits == 0:
+        raise ValueError("invalid fmt chunk")
+    return format_tag, channels, rate, bits
+
+
+class StreamingWavWriter:
+    """Append-only 16-byte-``fmt`` PCM WAV writer for live capture.
+
+    The RIFF and ``data`` sizes are patched after every write, so the file on
+    disk is a valid WAV at any moment and is complete as soon as ``close``
+    returns.
+    """
+
+    HEADER_SIZE = 44
+
+    def __init__(self, path: Path, channels: int, rate: int, sampwidth: int) -> None:
+        self.path = path
+        self.channels = channels
+        self.rate = rate
+        self.sampwidth = sampwidth
+        self.data_size = 0
+        self._handle = open(path, "wb")
+        block_align = channels * sampwidth
+        self._handle.write(
+            struct.pack(
+                "<4sI4s4sIHHIIHH4sI",
+                b"RIFF",
+                36,
+                b"WAVE",
+                b"fmt ",
+                16,
+                WAVE_FORMAT_PCM,
+                channels,
+                rate,
+                rate * block_align,
+                block_align,
+                sampwidth * 8,
+                b"data",
+                0,
+            )
+        )
+
+    @property
+    def frames(self) -> int:
+        return self.data_size // (self.channels * self.sampwidth)
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self._handle.seek(0, os.SEEK_END)
+        self._handle.write(data)
+        self.data_size += len(data)
+        self._patch_sizes()
+
+    def close(self) -> None:
+        if self._handle.closed:
+            return
+        if self.data_size & 1:
+            # RIFF chunks are padded to an even length.
+            self._handle.seek(0, os.SEEK_END)
+            self._handle.write(b"\0")
+        self._patch_sizes()
+        self._handle.close()
+
+    def _patch_sizes(self) -> None:
+        riff_size = 36 + self.data_size + (self.data_size & 1)
+        self._handle.seek(4)
+        self._handle.write(struct.pack("<I", riff_size))
+        self._handle.seek(40)
+        self._handle.write(struct.pack("<I", self.data_size))
+
+    def __enter__(self) -> StreamingWavWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def amplify_wav(
+    path: Path,
+    gain: float,
+    block_frames: int = BLOCK_FRAMES,
+    in_place: bool = True,
+    backend: dsp.Backend | None = None,
+) -> None:
+    """Scale every sample in ``path`` by ``gain``, one block at a time.
+
+    With ``in_place`` the ``data`` chunk of a PCM file is rewritten through a
+    memory map and nothing else is touched. Otherwise, or when the layout
+    can't be handled that way, the result goes to a sibling ``.part`` file
+    which then replaces the original.
+    """
+    if in_place:
+        try:
+            layout = read_layout(path)
+        except ValueError:
+            layout = None
+        if layout is not None and layout.is_pcm:
+            amplify_wav_in_place(path, gain, layout, block_frames, backend)
+            return
+    _amplify_wav_copy(path, gain, block_frames, backend)
+
+
+def amplify_wav_in_place(
+    path: Path,
+    gain: float,
+    layout: WavLayout | None = None,
+    block_frames: int = BLOCK_FRAMES,
+    backend: dsp.Backend | None = None,
+) -> None:
+    """Scale the PCM samples of ``path`` through a writable memory map."""
+    backend = backend or dsp.get_backend()
+    if layout is None:
+        layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    # Drop a trailing partial frame rather than scaling half a sample.
+    size = layout.data_size - layout.data_size % layout.block_align
+    if size <= 0:
+        return
+    block_bytes = block_frames * layout.block_align
+    with open(path, "r+b") as handle, mmap.mmap(handle.fileno(), 0) as view:
+        start = layout.data_offset
+        end = start + size
+        while start < end:
+            stop = min(start + block_bytes, end)
+            view[start:stop] = backend.mul(view[start:stop], layout.sampwidth, gain)
+            start = stop
+        view.flush()
+
+
+def process_wav(path: Path, stage: Stage, block_frames: int = BLOCK_FRAMES) -> None:
+    """Run ``path`` through ``stage`` (usually a ``stages.Chain``) in place.
+
+    Stages with look-ahead return less than they were given until ``flush``,
+    so the write position trails the read position and never overtakes it.
+    """
+    layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    size = layout.data_size - layout.data_size % layout.block_align
+    if size <= 0:
+        return
+    block_bytes = block_frames * layout.block_align
+    with open(path, "r+b") as handle, mmap.mmap(handle.fileno(), 0) as view:
+        read = write = layout.data_offset
+        end = read + size
+        while read < end:
+            stop = min(read + block_bytes, end)
+            out = stage.process(view[read:stop])
+            read = stop
+            view[write : write + len(out)] = out
+            write += len(out)
+        # Anything past the original length (a stage padding its tail) is dropped.
+        tail = stage.flush()[: end - write]
+        view[write : write + len(tail)] = tail
+        view.flush()
+
+
+def convert_wav(path: Path, stage: Stage, block_frames: int = BLOCK_FRAMES) -> None:
+    """Rewrite ``path`` in ``stage.output_format``, streaming through ``stage``.
+
+    For stages that change the size of the data (resampling, remixing,
+    requantizing): the result goes to a ``.part`` sibling which then replaces
+    the original.
+    """
+    layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    width, channels, rate = stage.output_format
+    block_bytes = block_frames * layout.block_align
+    remaining = layout.data_size - layout.data_size % layout.block_align
+    tmp_path = path.with_name(path.name + ".part")
+    try:
+        with open(path, "rb") as source, StreamingWavWriter(tmp_path, channels, rate, width) as writer:
+            source.seek(layout.data_offset)
+            while remaining > 0:
+                chunk = source.read(min(block_bytes, remaining))
+                if not chunk:
+                    break
+                writer.write(stage.process(chunk))
+                remaining -= len(chunk)
+            writer.write(stage.flush())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def trim_wav(path: Path, start_frame: int, end_frame: int, layout: WavLayout | None = None) -> None:
+    """Keep only frames ``[start_frame, end_frame)`` of a PCM WAV, in place.
+
+    The kept samples are moved down to the start of the ``data`` chunk, any
+    chunks that followed it are moved after them, and the file is truncated.
+    """
+    if layout is None:
+        layout = read_layout(path)
+    if not layout.is_pcm:
+        raise ValueError(f"unsupported WAV format tag {layout.format_tag:#x}")
+    frames = layout.data_size // layout.block_align
+    start_frame = max(0, min(start_frame, frames))
+    end_frame = max(start_frame, min(end_frame, frames))
+    if start_frame == 0 and end_frame == frames:
+        return
+    keep = (end_frame - start_frame) * layout.block_align
+    with open(path, "r+b") as handle:
+        file_size = os.fstat(handle.fileno()).st_size
+        old_end = min(file_size, layout.data_offset + layout.data_size + (layout.data_size & 1))
+        new_end = layout.data_offset + keep + (keep & 1)
+        trailing = file_size - old_end
+        with mmap.mmap(handle.fileno(), 0) as view:
+            view.move(layout.data_offset, layout.data_offset + start_frame * layout.block_align, keep)
+            if keep & 1:
+                view[new_end - 1] = 0
+            if trailing:
+                view.move(new_end, old_end, trailing)
+            struct.pack_into("<I", view, layout.data_offset - 4, keep)
+            struct.pack_into("<I", view, 4, new_end + trailing - 8)
+            view.flush()
+        handle.truncate(new_end + trailing)
+
+
+def _amplify_wav_copy(
+    path: Path,
+    gain: float,
+    block_frames: int,
+    backend: dsp.Backend | None,
+) -> None:
+    backend = backend or dsp.get_backend()
+    tmp_path = path.with_name(path.name + ".part")
+    try:
+        with wave.open(str(path), "rb") as reader, wave.open(str(tmp_path), "wb") as writer:
+            params = reader.getparams()
+            writer.setparams(params)
+            while True:
+                frames = reader.readframes(block_frames)
+                if not frames:
+                    break
+                # writeframesraw skips the per-call header patch; close() fixes it up.
+                writer.writeframesraw(backend.mul(frames, params.sampwidth, gain))
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,59 @@
+"""Background post-processing so the reviewer never waits on DSP work."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable
+
+from aqt.qt import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _Job(QRunnable):
+    def __init__(self, owner: PostProcessor, path: Path, func: Callable[[Path], Path | None]) -> None:
+        super().__init__()
+        self._owner = owner
+        self._path = path
+        self._func = func
+
+    def run(self) -> None:
+        # Runs on the pool thread: only emit signals, never touch widgets here.
+        try:
+            final = self._func(self._path)
+        except Exception as exc:
+            self._owner.failed.emit(self._path, str(exc))
+        else:
+            self._owner.finished.emit(self._path, final or self._path)
+
+
+class PostProcessor(QObject):
+    """FIFO job queue backed by a single-thread ``QThreadPool``.
+
+    One worker thread keeps jobs in submission order and stops two passes from
+    touching the same file at once. ``finished``/``failed`` are emitted from the
+    worker and delivered to slots on the GUI thread through Qt's queued
+    connections. A job may return the path the take ended up at (e.g. after
+    encoding it to another format); ``finished`` carries the submitted path
+    and that final path.
+    """
+
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._pending: set[Path] = set()
+        self.finished.connect(lambda path, _final: self._pending.discard(path))
+        self.failed.connect(lambda path, _error: self._pending.discard(path))
+
+    def submit(self, path: Path, func: Callable[[Path], Path | None]) -> None:
+        self._pending.add(path)
+        self._pool.start(_Job(self, path, func))
+
+    def is_pending(self, path: Path) -> bool:
+        return path in self._pending
+
+    def wait(self, msecs: int = -1) -> bool:
+        """Block until queued jobs are done; used when the profile closes."""
+        return self._pool.waitForDone(msecs)